@@ -1,25 +1,74 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
-from .db import init_db
+from .assets import STATIC_DIR, STATIC_URL, PrecompressedStaticFiles, static_assets
+from .db import async_engine, init_db
+from .dependencies import get_settings
+from .instrumentation import report_cache_stats
+from .jobs import job_workers
+from .middleware import CompressionMiddleware, QueryStatsMiddleware
 from .routes.todo import router as todo_router
 from .routes.user import router as auth_router
+from .tasks import schedule_periodic_jobs  # (also registers the job handlers)
+from .templating import precompile_templates
+from .utils.broker import broker
+from .utils.hashing import password_hasher
+from .utils.todo import todo_cache
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize the database
     init_db()
+    precompile_templates()
+    password_hasher.start()
+    job_workers.start()
+    await schedule_periodic_jobs()
+    await broker.start()
+    settings = get_settings()
+    cache_stats = None
+    if settings.cache_stats_interval:
+        cache_stats = asyncio.create_task(
+            report_cache_stats({"todo": todo_cache}, settings.cache_stats_interval)
+        )
     yield
+    if cache_stats is not None:
+        cache_stats.cancel()
+    await broker.stop()
+    # Let running jobs finish before their connections go away
+    await job_workers.stop()
+    password_hasher.shutdown()
+    # Close pooled async connections on shutdown
+    await async_engine.dispose()
 
 
 def create_app() -> FastAPI:
     app = FastAPI(lifespan=lifespan)
+    settings = get_settings()
 
-    # Mount static files
-    app.mount("/static", StaticFiles(directory="app/static"), name="static")
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+    )
+    # Outermost, so that it sees the whole request
+    app.add_middleware(
+        QueryStatsMiddleware,
+        query_budget=settings.sql_query_budget,
+        repeat_threshold=settings.sql_repeat_threshold,
+        server_timing=settings.sql_server_timing,
+    )
+
+    # Mount static files; precompressed variants are served when present, and
+    # fingerprinted `asset_url()` paths are cached for good
+    app.mount(
+        STATIC_URL,
+        PrecompressedStaticFiles(directory=STATIC_DIR, manifest=static_assets),
+        name="static",
+    )
 
     # Include routers for the application
     app.include_router(todo_router, tags=["todos"])
@@ -0,0 +1,146 @@
+import hashlib
+import mimetypes
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from app.dependencies import get_settings
+from app.responses import negotiate_content_encoding
+
+settings = get_settings()
+
+STATIC_DIR = "app/static"
+STATIC_URL = "/static"
+
+# Variants written by scripts/precompress_static.py, most preferred first
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# A fingerprinted URL names exactly one version of the file, so it can be
+# cached for as long as caches allow without ever being revalidated
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    """`main.css` -> `main.<first 12 hex digits of its SHA-256>.css`"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+class AssetManifest:
+    """
+    Content-hashed names for the files in a static directory, computed once
+    at startup. With `auto_reload` a file is rehashed when it changes, for
+    development.
+    """
+
+    def __init__(self, directory: str, prefix: str, auto_reload: bool = False):
+        self.directory = directory
+        self.prefix = prefix
+        self.auto_reload = auto_reload
+        # original -> (fingerprinted, mtime) and fingerprinted -> original,
+        # both relative to `directory`
+        self._hashed: dict[str, tuple[str, float]] = {}
+        self._originals: dict[str, str] = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if os.path.splitext(name)[1] in PRECOMPRESSED_SUFFIXES.values():
+                    continue
+                path = os.path.join(root, name)
+                self._add(os.path.relpath(path, directory).replace(os.sep, "/"))
+
+    def _add(self, name: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "rb") as f:
+            hashed = fingerprint(name, f.read())
+        self._hashed[name] = (hashed, os.stat(path).st_mtime)
+        self._originals[hashed] = name
+        return hashed
+
+    def url(self, name: str) -> str:
+        """URL of the fingerprinted copy of `name`, e.g. for `asset_url()`."""
+        entry = self._hashed.get(name)
+        if entry is None:
+            # Not a known asset: leave it uncached rather than fail the page
+            return f"{self.prefix}/{name}"
+        hashed, mtime = entry
+        if self.auto_reload:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path) and os.stat(path).st_mtime != mtime:
+                hashed = self._add(name)
+        return f"{self.prefix}/{hashed}"
+
+    def original(self, path: str) -> str | None:
+        """The file a fingerprinted `path` stands for, if it is one."""
+        return self._originals.get(path)
+
+
+static_assets = AssetManifest(
+    STATIC_DIR, STATIC_URL, auto_reload=settings.template_auto_reload
+)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    `StaticFiles` that serves `<file>.br` or `<file>.gz` in place of `<file>`
+    when the client accepts that encoding, so static assets are compressed
+    once at build time (at the highest level) instead of on every request.
+    A variant older than its source is ignored rather than served stale.
+
+    Fingerprinted paths from `manifest` are served as the file they stand for
+    with `Cache-Control: immutable`.
+    """
+
+    def __init__(self, *args, manifest: AssetManifest | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        original = self.manifest.original(path) if self.manifest else None
+        if original is None:
+            return await super().get_response(path, scope)
+        response = await super().get_response(original, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        available = {}
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            try:
+                variant_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            if variant_stat.st_mtime >= stat_result.st_mtime:
+                available[encoding] = (f"{full_path}{suffix}", variant_stat)
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_content_encoding(
+            request_headers.get("accept-encoding"), list(available)
+        )
+        if encoding is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+            if available:
+                response.headers.add_vary_header("Accept-Encoding")
+            return response
+
+        variant_path, variant_stat = available[encoding]
+        media_type, _ = mimetypes.guess_type(str(full_path))
+        response = FileResponse(
+            variant_path,
+            status_code=status_code,
+            stat_result=variant_stat,
+            media_type=media_type or "text/plain",
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -12,6 +12,96 @@ class Settings(BaseSettings):
     secret_key: str
     encryption_algo: str
 
+    # Connection pool settings, shared by the sync and async engines
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Log every statement (SQLAlchemy `echo`); for debugging only
+    db_echo: bool = False
+
+    # Per-request SQL instrumentation: a warning is logged for requests that run
+    # more than `sql_query_budget` statements, or the same statement
+    # `sql_repeat_threshold` times (an N+1 pattern). Counts and DB time are sent
+    # in a `Server-Timing` header unless `sql_server_timing` is off
+    sql_query_budget: int = 20
+    sql_repeat_threshold: int = 5
+    sql_server_timing: bool = True
+
+    # Per-user todo list cache; a maxsize of 0 disables it
+    todo_cache_maxsize: int = 1024
+    todo_cache_ttl: float = 30.0
+    # Each process logs its caches' hit/miss counts this often (0: never)
+    cache_stats_interval: float = 300.0
+
+    # How often each worker reloads revoked tokens from the database, and how
+    # often rows for tokens that have since expired are deleted (0: never)
+    token_denylist_refresh_seconds: float = 30.0
+    token_denylist_prune_interval: float = 3600.0
+
+    # bcrypt cost factor; existing hashes are upgraded on the next login
+    bcrypt_rounds: int = 12
+    # Executor for password hashing: "process" or "thread". Workers default to
+    # the number of cores; calls beyond workers + max_pending get a 503
+    password_hasher_executor: str = "process"
+    password_hasher_workers: int | None = None
+    password_hasher_max_pending: int = 32
+    password_hasher_retry_after: int = 1
+
+    # Admission control for /auth/login and /auth/signup: token buckets hold
+    # `capacity` attempts and refill at `per_minute`
+    auth_rate_limit_ip_capacity: int = 20
+    auth_rate_limit_ip_per_minute: float = 10
+    auth_rate_limit_username_capacity: int = 5
+    auth_rate_limit_username_per_minute: float = 5
+    auth_max_concurrency: int = 32
+
+    # Attachments are streamed to `upload_dir` in `upload_chunk_size` pieces
+    upload_dir: str = "uploads"
+    upload_chunk_size: int = 64 * 1024
+    max_upload_size: int = 10 * 1024 * 1024
+    # Unreferenced blobs are only collected once unused for this long; a sweep
+    # for them runs every `blob_gc_interval` seconds (0: never)
+    blob_gc_grace_seconds: int = 3600
+    blob_gc_interval: float = 3600.0
+
+    # Background job workers per process; 0 disables them (e.g. in web-only
+    # processes when workers are scaled separately). Failed jobs retry with
+    # exponential backoff, capped at `job_backoff_max` seconds
+    job_workers: int = 2
+    job_poll_interval: float = 1.0
+    job_max_attempts: int = 5
+    job_backoff_base: float = 2.0
+    job_backoff_max: float = 600.0
+    # A running job whose lock is older than this is assumed abandoned; workers
+    # refresh the locks of the jobs they run every third of it
+    job_lock_timeout: int = 600
+    job_drain_timeout: float = 30.0
+    # How often the per-user todo counts are checked against the rows (0: never)
+    todo_counts_reconcile_interval: float = 3600.0
+
+    # Pub/sub for live updates: "memory" for a single worker, "postgres"
+    # (LISTEN/NOTIFY) to fan out across workers. Subscribers that fall
+    # `event_queue_size` messages behind are told to resync
+    event_broker: str = "memory"
+    event_queue_size: int = 100
+    sse_keepalive_seconds: float = 15.0
+
+    # Response compression (brotli or gzip, as negotiated); smaller bodies are
+    # sent as they are
+    compression_minimum_size: int = 500
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # Jinja bytecode cache directory (None: a per-user temporary directory).
+    # Auto-reload re-checks template files on every render; for development
+    template_cache_dir: str | None = None
+    template_auto_reload: bool = False
+    # Rendered todo rows, by (id, version); a size of 0 disables the cache
+    todo_fragment_cache_size: int = 0
+    todo_fragment_cache_ttl: float = 3600.0
+
     model_config = SettingsConfigDict(env_file="/.env")
 
 
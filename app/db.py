@@ -1,7 +1,10 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.dependencies import get_settings
-from app.models import todo, user  # noqa: F401
+from app.instrumentation import instrument_engine
+from app.models import blob, job, todo, token, user  # noqa: F401
 
 settings = get_settings()
 
@@ -10,7 +13,36 @@ DATABASE_URL = (
     f"@{settings.db_host}/{settings.postgres_db}"
 )
 
-engine = create_engine(DATABASE_URL, echo=True)
+# Same database, reached through the asyncpg driver so that queries issued from
+# `async def` route handlers don't block the event loop
+ASYNC_DATABASE_URL = (
+    f"postgresql+asyncpg://{settings.postgres_user}:{settings.postgres_password}"
+    f"@{settings.db_host}/{settings.postgres_db}"
+)
+
+POOL_OPTIONS = {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+    "pool_recycle": settings.db_pool_recycle,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+}
+
+engine = create_engine(DATABASE_URL, echo=settings.db_echo, **POOL_OPTIONS)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, echo=settings.db_echo, **POOL_OPTIONS
+)
+
+# Per-request query counts and timings (see `app.instrumentation`)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+# * expire_on_commit=False because attribute access after a commit would
+# * otherwise trigger an implicit (and, under asyncio, illegal) lazy refresh
+async_session_maker = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
 def init_db():
@@ -24,3 +56,13 @@ def get_session():
 
 def SessionLocal():
     return Session(engine)
+
+
+async def get_async_session():
+    async with async_session_maker() as session:
+        yield session
+
+
+def get_async_session_maker():
+    """For responses that outlive the request, and so need their own session."""
+    return async_session_maker
@@ -0,0 +1,109 @@
+"""
+Per-request SQL statistics, collected through SQLAlchemy engine events, and
+periodic cache statistics in the log.
+
+`QueryStatsMiddleware` (in `app.middleware`) opens a `QueryStats` for each
+request in `query_stats`; the event hooks on every instrumented engine add
+each statement to whichever one is current. Statements run outside a request
+(jobs, the broker, start-up) aren't recorded.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements in log messages are cut to this many characters
+SQL_LOG_LENGTH = 200
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: str | None = None
+        # Keyed by the SQL with its placeholders, so the same query with
+        # different parameters counts as one shape
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.shapes[statement] += 1
+        if duration >= self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statement shapes run at least `threshold` times, most frequent first."""
+        return [
+            (statement, count)
+            for statement, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def server_timing(self) -> str:
+        """`Server-Timing` value: total and slowest statement time, in ms."""
+        return (
+            f'db;dur={self.total_time * 1000:.1f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_time * 1000:.1f}"
+        )
+
+
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if query_stats.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = query_stats.get()
+    started = conn.info.pop("query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record `engine`'s statements (for an async engine, pass `.sync_engine`)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def shorten_sql(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) <= SQL_LOG_LENGTH:
+        return statement
+    return statement[:SQL_LOG_LENGTH] + "…"
+
+
+def log_cache_stats(name: str, cache) -> None:
+    stats = cache.stats()
+    logger.info(
+        "%s cache: %d hits, %d misses (%.1f%% hit rate), %d of %d entries",
+        name,
+        stats["hits"],
+        stats["misses"],
+        stats["hit_rate"] * 100,
+        stats["size"],
+        stats["maxsize"],
+    )
+
+
+async def report_cache_stats(caches: dict, interval: float) -> None:
+    """
+    Log the stats of each of `caches` (an `LRUCache` by name) every `interval`
+    seconds, until cancelled. The counts are this process's own.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        for name, cache in caches.items():
+            log_cache_stats(name, cache)
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import random
+import traceback
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db import async_session_maker
+from app.dependencies import get_settings
+from app.models.job import Job, JobStatus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, dict], Awaitable[None]]
+job_handlers: dict[str, JobHandler] = {}
+
+# Keep the tail of the traceback, that's where the error is
+MAX_ERROR_LENGTH = 4000
+
+
+def job_handler(name: str):
+    """Register the decorated coroutine as the handler for jobs called `name`."""
+
+    def register(handler: JobHandler) -> JobHandler:
+        job_handlers[name] = handler
+        return handler
+
+    return register
+
+
+async def enqueue_job(
+    session: AsyncSession,
+    name: str,
+    payload: dict | None = None,
+    delay: float = 0,
+    max_attempts: int | None = None,
+) -> Job:
+    """
+    Queue a job to run once `delay` seconds have passed.
+
+    Returns:
+        Job: The queued job.
+    """
+    job = Job(
+        name=name,
+        payload=payload or {},
+        max_attempts=max_attempts or settings.job_max_attempts,
+        run_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
+    )
+    session.add(job)
+    await session.commit()
+    if not delay:
+        job_workers.wake()
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, so failing jobs don't retry in lockstep."""
+    delay = min(
+        settings.job_backoff_max, settings.job_backoff_base * 2 ** (attempts - 1)
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def claim_job(session: AsyncSession) -> Job | None:
+    """
+    Lock the next due job and mark it running. `SKIP LOCKED` lets any number of
+    workers, in any number of processes, poll the table without blocking on or
+    double-claiming each other's jobs.
+    """
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=settings.job_lock_timeout)
+    next_job = (
+        select(Job.id)
+        .where(
+            or_(
+                and_(Job.status == JobStatus.queued, Job.run_at <= now),
+                # The worker running it died; its lock has expired
+                and_(Job.status == JobStatus.running, Job.locked_at < stale),
+            )
+        )
+        .order_by(Job.run_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    statement = (
+        update(Job)
+        .where(Job.id == next_job)
+        .values(status=JobStatus.running, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job)
+        .execution_options(synchronize_session=False)
+    )
+    job = (await session.exec(statement)).scalar_one_or_none()
+    await session.commit()
+    return job
+
+
+async def run_job(session: AsyncSession, job: Job) -> JobStatus:
+    """
+    Run a claimed job and record the outcome: `done`, back to `queued` with a
+    backoff, or `dead` once it has used up its attempts.
+    """
+    # Read up front: rolling back after a failure expires `job`, and reloading
+    # it lazily isn't possible under asyncio
+    job_id, name, payload = job.id, job.name, job.payload
+    attempts, max_attempts = job.attempts, job.max_attempts
+    try:
+        handler = job_handlers.get(name)
+        if handler is None:
+            raise LookupError(f"No handler registered for job {name!r}")
+        await handler(session, payload)
+    except Exception:
+        await session.rollback()
+        logger.exception("Job %s (%s) failed", job_id, name)
+        values = {"last_error": traceback.format_exc()[-MAX_ERROR_LENGTH:]}
+        if attempts >= max_attempts:
+            values["status"] = JobStatus.dead
+        else:
+            values["status"] = JobStatus.queued
+            values["run_at"] = datetime.now(timezone.utc) + timedelta(
+                seconds=retry_delay(attempts)
+            )
+    else:
+        values = {"status": JobStatus.done}
+
+    await session.exec(
+        update(Job).where(Job.id == job_id).values(locked_at=None, **values)
+    )
+    await session.commit()
+    return values["status"]
+
+
+async def refresh_job_lock(
+    session_maker: async_sessionmaker, job_id: str, interval: float
+) -> None:
+    """
+    Heartbeat for a running job: move its `locked_at` forward every `interval`
+    seconds, so a job that runs longer than `job_lock_timeout` isn't taken for
+    abandoned and run a second time.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_maker() as session:
+                await session.exec(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == JobStatus.running)
+                    .values(locked_at=datetime.now(timezone.utc))
+                )
+                await session.commit()
+        except Exception:
+            logger.exception("Could not refresh the lock on job %s", job_id)
+
+
+async def run_next_job(session_maker: async_sessionmaker = async_session_maker) -> bool:
+    """
+    Claim and run one due job, keeping its lock fresh while it runs.
+
+    Returns:
+        bool: False if there was nothing to run.
+    """
+    async with session_maker() as session:
+        job = await claim_job(session)
+        if job is None:
+            return False
+        heartbeat = asyncio.create_task(
+            refresh_job_lock(session_maker, job.id, settings.job_lock_timeout / 3)
+        )
+        try:
+            await run_job(session, job)
+        finally:
+            heartbeat.cancel()
+            with suppress(asyncio.CancelledError):
+                await heartbeat
+        return True
+
+
+class JobWorkerPool:
+    """
+    `concurrency` workers in this process, each running one job at a time.
+    Idle workers poll every `poll_interval` seconds, or sooner when a job is
+    queued from this process. `stop` lets running jobs finish for up to
+    `drain_timeout` seconds before cancelling them; a cancelled job is picked
+    up again once its lock expires.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        drain_timeout: float = 30.0,
+        session_maker: async_sessionmaker = async_session_maker,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.session_maker = session_maker
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+        self._wakeup: asyncio.Event | None = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            try:
+                ran = await run_next_job(self.session_maker)
+            except Exception:
+                logger.exception("Job worker could not claim a job")
+                ran = False
+            if ran or self._stopping:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        if not self._tasks:
+            return
+        self._stopping = True
+        self.wake()
+        _, pending = await asyncio.wait(self._tasks, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+
+job_workers = JobWorkerPool(
+    concurrency=settings.job_workers,
+    poll_interval=settings.job_poll_interval,
+    drain_timeout=settings.job_drain_timeout,
+)
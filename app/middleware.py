@@ -0,0 +1,243 @@
+import logging
+import zlib
+
+import anyio
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.instrumentation import QueryStats, query_stats, shorten_sql
+from app.responses import negotiate_content_encoding
+
+logger = logging.getLogger(__name__)
+
+# Preferred first: brotli is smaller than gzip at similar CPU cost
+CONTENT_ENCODINGS = ("br", "gzip")
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    # Event streams must reach the client as soon as each event is written
+    if media_type == "text/event-stream":
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        # wbits=31: gzip container rather than a raw zlib stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        # Sync flush so that a streamed chunk can be decoded on arrival
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress text-like responses with brotli or gzip, whichever the client
+    prefers. Responses below `minimum_size` are sent as they are. Streamed
+    responses are compressed chunk by chunk. Responses that are already
+    encoded, and byte-range capable file downloads (`Accept-Ranges`), are
+    left alone.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_content_encoding(
+            Headers(scope=scope).get("accept-encoding"), CONTENT_ENCODINGS
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def encoder(self, encoding: str):
+        if encoding == "br":
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Message | None = None
+        self.encoder = None
+        self.passthrough = False
+
+    def should_compress(self, headers: MutableHeaders) -> bool:
+        status = self.start_message["status"]
+        return (
+            200 <= status < 300
+            and status not in (204, 206)
+            and "content-encoding" not in headers
+            and "content-range" not in headers
+            and "accept-ranges" not in headers
+            and is_compressible(headers.get("content-type", ""))
+        )
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Held back until the first body message shows how big it is
+            self.start_message = message
+            return
+        if self.start_message is None or self.passthrough:
+            # e.g. the test client's `http.response.debug`, sent before start
+            await self._send(message)
+            return
+        if self.encoder is not None:
+            await self.send_compressed(message)
+            return
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        if not self.should_compress(headers):
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        if message_type == "http.response.pathsend":
+            # A compressible static file without a precompressed variant
+            async with await anyio.open_file(message["path"], "rb") as file:
+                message = {"type": "http.response.body", "body": await file.read()}
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not more_body and len(body) < self.middleware.minimum_size:
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        self.encoder = self.middleware.encoder(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        # The bytes differ from the identity representation's
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        if more_body:
+            del headers["Content-Length"]
+            await self._send(self.start_message)
+            await self.send_compressed(message)
+        else:
+            compressed = self.encoder.compress(body) + self.encoder.finish()
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        more_body = message.get("more_body", False)
+        body = self.encoder.compress(message.get("body", b""))
+        if not more_body:
+            body += self.encoder.finish()
+        await self._send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
+
+
+class QueryStatsMiddleware:
+    """
+    Collect SQL statistics for each request (see `app.instrumentation`).
+    Those so far are sent in a `Server-Timing` header when the response
+    starts; once it is finished, a warning is logged if the request went over
+    `query_budget` statements or ran one statement `repeat_threshold` times.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        query_budget: int = 20,
+        repeat_threshold: int = 5,
+        server_timing: bool = True,
+    ):
+        self.app = app
+        self.query_budget = query_budget
+        self.repeat_threshold = repeat_threshold
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and stats.count:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        token = query_stats.set(stats)
+        try:
+            await self.app(
+                scope, receive, send_with_timing if self.server_timing else send
+            )
+        finally:
+            query_stats.reset(token)
+            self.check(scope, stats)
+
+    def check(self, scope: Scope, stats: QueryStats) -> None:
+        request = f"{scope['method']} {scope['path']}"
+        if stats.count > self.query_budget:
+            logger.warning(
+                "%s ran %d queries (budget %d) in %.1fms; slowest %.1fms: %s",
+                request,
+                stats.count,
+                self.query_budget,
+                stats.total_time * 1000,
+                stats.slowest_time * 1000,
+                shorten_sql(stats.slowest_statement or ""),
+            )
+        for statement, count in stats.repeated(self.repeat_threshold):
+            logger.warning(
+                "%s ran the same query %d times (N+1?): %s",
+                request,
+                count,
+                shorten_sql(statement),
+            )
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, func
+from sqlmodel import Field, SQLModel
+
+
+class Blob(SQLModel, table=True):
+    """
+    Content-addressed attachment data, stored once however many todos use it.
+
+    A blob's references are the todos whose `blob_sha256` points at it; a blob
+    with none left is removed by garbage collection.
+    """
+
+    sha256: str = Field(primary_key=True, max_length=64)
+    size: int
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False,
+    )
+    # Bumped whenever an upload resolves to this blob; garbage collection
+    # leaves recently used blobs alone so it can't race an in-flight upload
+    last_used_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False,
+    )
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from enum import Enum
+from uuid import uuid4
+
+from sqlalchemy import DateTime
+from sqlalchemy import Enum as SAEnum
+from sqlalchemy import Index, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    # Out of attempts; kept for inspection and manual requeueing
+    dead = "dead"
+
+
+class Job(SQLModel, table=True):
+    """
+    A unit of background work, claimed by one worker at a time with
+    `FOR UPDATE SKIP LOCKED`. Failed jobs go back to `queued` with a later
+    `run_at` until `max_attempts` is reached, then to `dead`.
+    """
+
+    # Workers only ever look for due queued jobs
+    __table_args__ = (Index("ix_job_status_run_at", "status", "run_at"),)
+
+    id: str | None = Field(default_factory=lambda: str(uuid4()), primary_key=True)
+    name: str
+    payload: dict = Field(default_factory=dict, sa_type=JSONB)
+    status: JobStatus = Field(
+        default=JobStatus.queued,
+        sa_type=SAEnum(JobStatus, native_enum=False, length=16),
+        nullable=False,
+    )
+    attempts: int = 0
+    max_attempts: int = 5
+    run_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False,
+    )
+    locked_at: datetime | None = Field(default=None, sa_type=DateTime(timezone=True))
+    last_error: str | None = None
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False,
+    )
@@ -1,19 +1,182 @@
+from datetime import datetime, timezone
 from uuid import uuid4
 
+from pydantic import computed_field
+from sqlalchemy import DDL, BigInteger, DateTime, Index, event, func, text
 from sqlmodel import Field, Relationship, SQLModel
 
+# Bounded so that a (user_id, title, id) index entry stays well inside a btree
+# page (about 2.7 KB), however wide the characters
+TODO_TITLE_MAX_LENGTH = 500
+
 
 class TodoBase(SQLModel):
-    title: str
+    title: str = Field(max_length=TODO_TITLE_MAX_LENGTH)
     done: bool = False
 
 
 class Todo(TodoBase, table=True):
+    # Keyset pagination walks (user_id, <sort key>, id) in either direction,
+    # with partial indexes for the active/completed views (see `TODO_SORT_KEYS`).
+    # Title search matches against the GIN-indexed `todo_search_vector`
+    # expression, which queries have to repeat exactly (see `TODO_SEARCH_VECTOR`)
+    __table_args__ = (
+        Index("ix_todo_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index(
+            "ix_todo_active_user_id_created_at_id",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_where=text("NOT done"),
+        ),
+        Index(
+            "ix_todo_completed_user_id_created_at_id",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_where=text("done"),
+        ),
+        Index("ix_todo_user_id_title_id", "user_id", "title", "id"),
+        Index(
+            "ix_todo_active_user_id_title_id",
+            "user_id",
+            "title",
+            "id",
+            postgresql_where=text("NOT done"),
+        ),
+        Index(
+            "ix_todo_completed_user_id_title_id",
+            "user_id",
+            "title",
+            "id",
+            postgresql_where=text("done"),
+        ),
+        Index(
+            "ix_todo_user_id_title_search",
+            text("todo_search_vector(user_id, title)"),
+            postgresql_using="gin",
+        ),
+    )
+
     id: str | None = Field(default_factory=lambda: str(uuid4()), primary_key=True)
     user_id: str | None = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+        nullable=False,
+    )
+    # Attachment: original (display) name, content hash and where it is stored
+    file_name: str | None = None
+    file_path: str | None = None
+    blob_sha256: str | None = Field(default=None, foreign_key="blob.sha256", index=True)
+    # Bumped by every update; rendered rows are cached by (id, version)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
 
     user: "User" = Relationship(back_populates="todos")  # type: ignore # noqa: F821
 
 
+# The words of a title, each prefixed with its owner's id (`<user_id>/milk`).
+# A prefix search for one user's words is then a range scan over just their
+# index entries, rather than over every user's words that share the prefix
+TODO_SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION todo_search_vector(user_id text, title text)
+RETURNS tsvector LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT array_to_tsvector(array_agg(user_id || '/' || word))
+    FROM unnest(tsvector_to_array(to_tsvector('simple', title))) AS word
+$$
+"""
+
+# What the user typed, split into words by the same parser as the titles
+# (`bob@example.com` and `v1.2` stay whole), as a query for titles containing
+# every word as a prefix. NULL, which matches nothing, if there are no words
+TODO_SEARCH_QUERY_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION todo_search_query(user_id text, q text)
+RETURNS tsquery LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT string_agg(
+        ''''
+            || replace(replace(user_id || '/' || word, '\', '\\'), '''', '''''')
+            || ''':*',
+        ' & '
+    )::tsquery
+    FROM unnest(tsvector_to_array(to_tsvector('simple', q))) AS word
+$$
+"""
+
+# For `create_all`; migrations create them themselves
+for function in (TODO_SEARCH_VECTOR_FUNCTION, TODO_SEARCH_QUERY_FUNCTION):
+    event.listen(Todo.__table__, "before_create", DDL(function))
+event.listen(
+    Todo.__table__,
+    "after_drop",
+    DDL(
+        "DROP FUNCTION IF EXISTS todo_search_vector(text, text), "
+        "todo_search_query(text, text)"
+    ),
+)
+
+
+class TodoCounter(SQLModel, table=True):
+    """Per-user bookkeeping over the todo table, maintained by the write helpers."""
+
+    user_id: str = Field(primary_key=True, foreign_key="user.id")
+    # Advanced by every write to the user's todos; list ETags derive from it
+    version: int = Field(default=0, sa_type=BigInteger)
+    # Kept in step with the rows by the same writes, so showing them never needs
+    # a COUNT(*); `reconcile_todo_counts_async` repairs any drift
+    total: int = Field(
+        default=0, sa_type=BigInteger, sa_column_kwargs={"server_default": "0"}
+    )
+    done: int = Field(
+        default=0, sa_type=BigInteger, sa_column_kwargs={"server_default": "0"}
+    )
+
+
 class TodoCreate(TodoBase):
     ...
+
+
+# Response schemas for the JSON/MessagePack API; built straight from `Todo` rows
+
+
+class TodoRead(TodoBase):
+    id: str
+    user_id: str | None = None
+    created_at: datetime
+    # Where attachments are stored stays on the server: clients get the name
+    # and `attachment_url`
+    file_name: str | None = None
+    blob_sha256: str | None = Field(default=None, exclude=True)
+    version: int = 1
+
+    @computed_field
+    @property
+    def attachment_url(self) -> str | None:
+        if self.file_name is None:
+            return None
+        # Versioned by content hash, like the download link on the page
+        url = f"/todos/{self.id}/attachment"
+        return f"{url}?v={self.blob_sha256}" if self.blob_sha256 else url
+
+
+class TodoList(SQLModel):
+    items: list[TodoRead]
+
+
+class TodoPage(TodoList):
+    next_cursor: str | None = None
+
+
+class TodoCounts(SQLModel):
+    total: int = 0
+    done: int = 0
+
+
+class TodosDeleted(SQLModel):
+    deleted: list[str]
+
+
+class TodosReset(SQLModel):
+    """Sent instead of the affected todos when there were too many to list."""
+
+    reset: bool = True
@@ -1,4 +1,8 @@
-from sqlmodel import SQLModel
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import DateTime
+from sqlmodel import Field, SQLModel
 
 
 class Token(SQLModel):
@@ -8,3 +12,20 @@ class Token(SQLModel):
 
 class TokenData(SQLModel):
     username: str
+    user_id: str | None = None
+
+
+class RevokedToken(SQLModel, table=True):
+    """
+    Deny-list entry. Revokes a single token by `jti`, or, when only `user_id` is
+    set, every token issued to that user up to `revoked_at` (forced logout).
+    Rows are irrelevant once `expires_at` has passed.
+    """
+
+    id: str | None = Field(default_factory=lambda: str(uuid4()), primary_key=True)
+    jti: str | None = Field(default=None, index=True)
+    user_id: str | None = Field(default=None, index=True)
+    revoked_at: datetime = Field(sa_type=DateTime(timezone=True), nullable=False)
+    expires_at: datetime = Field(
+        sa_type=DateTime(timezone=True), nullable=False, index=True
+    )
@@ -20,3 +20,15 @@ class UserCreate(UserBase):
 
 class UserResponse(UserBase):
     id: str
+
+
+class Principal(SQLModel):
+    """
+    The authenticated user, built from the access token's claims so that
+    protected routes don't need to load the `User` row.
+    """
+
+    id: str
+    username: str
+    token_id: str | None = None
+    expires_at: int | None = None
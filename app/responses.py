@@ -0,0 +1,257 @@
+import os
+import re
+from typing import Sequence
+
+import anyio
+import msgpack
+import pydantic_core
+from fastapi import Request, Response, status
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = {MSGPACK_MEDIA_TYPE, "application/x-msgpack"}
+_JSON_MEDIA_TYPES = {JSON_MEDIA_TYPE, "application/*", "*/*"}
+
+
+def parse_quality_list(header: str) -> dict[str, float]:
+    """`a;q=0.5, b` -> {"a": 0.5, "b": 1.0}, for Accept-style headers."""
+    qualities: dict[str, float] = {}
+    for item in header.split(","):
+        value, *params = (part.strip() for part in item.split(";"))
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, raw = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        value = value.lower()
+        qualities[value] = max(q, qualities.get(value, 0.0))
+    return qualities
+
+
+def negotiate_content_encoding(
+    accept_encoding: str | None, available: Sequence[str]
+) -> str | None:
+    """
+    The encoding of `available` that `Accept-Encoding` rates highest, ties
+    going to the earlier one, or None for the identity encoding.
+    """
+    if not accept_encoding:
+        return None
+    qualities = parse_quality_list(accept_encoding)
+    wildcard = qualities.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = qualities.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def negotiate_api_media_type(accept: str | None) -> str:
+    """
+    JSON, unless `Accept` names MessagePack with at least the quality it gives
+    JSON. MessagePack is opt-in: a wildcard alone never selects it.
+    """
+    qualities = parse_quality_list(accept or JSON_MEDIA_TYPE)
+    json_q = max((qualities.get(t, 0.0) for t in _JSON_MEDIA_TYPES), default=0.0)
+    msgpack_q = max(qualities.get(t, 0.0) for t in _MSGPACK_MEDIA_TYPES)
+    if msgpack_q > 0 and msgpack_q >= json_q:
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def api_response(
+    request: Request,
+    content,
+    status_code: int = status.HTTP_200_OK,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """
+    Serialize response models straight to bytes with pydantic-core's
+    serializer, skipping `jsonable_encoder`'s pure-Python walk and the
+    intermediate dicts. `Accept: application/msgpack` gets MessagePack.
+    """
+    media_type = negotiate_api_media_type(request.headers.get("accept"))
+    if media_type == MSGPACK_MEDIA_TYPE:
+        body = msgpack.packb(pydantic_core.to_jsonable_python(content))
+    else:
+        body = pydantic_core.to_json(content)
+    response = Response(body, status_code, headers, media_type)
+    vary = {
+        value.strip().lower() for value in response.headers.get("vary", "").split(",")
+    }
+    if "accept" not in vary:
+        response.headers.add_vary_header("Accept")
+    return response
+
+
+class RangeFileResponse(FileResponse):
+    """
+    `FileResponse` for the byte range `start`..`end` (inclusive) of a file.
+
+    The body is handed to the server when it supports it, so the file never
+    passes through Python: `http.response.zerocopysend` (sendfile) for any
+    range and `http.response.pathsend` for whole files. Otherwise it is
+    streamed in `chunk_size` pieces.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        start: int = 0,
+        end: int | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = stat_result.st_size - 1 if end is None else end
+        self.headers["content-length"] = str(self.length)
+
+    @property
+    def length(self) -> int:
+        return max(0, self.end - self.start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        extensions = scope.get("extensions") or {}
+        is_whole_file = self.start == 0 and self.length == self.stat_result.st_size
+
+        if scope["method"].upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            # The extension takes the file object itself, not its descriptor
+            with open(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": self.start,
+                        "count": self.length,
+                        "more_body": False,
+                    }
+                )
+        elif is_whole_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.start)
+                remaining = self.length
+                while remaining:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": chunk,
+                            "more_body": remaining > 0,
+                        }
+                    )
+                if remaining:
+                    # File shrank underneath us; end the response cleanly
+                    await send(
+                        {"type": "http.response.body", "body": b"", "more_body": False}
+                    )
+        if self.background is not None:
+            await self.background()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in candidates
+
+
+def parse_byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single `bytes=` range into inclusive (start, end) offsets.
+
+    Returns None for a syntactically valid but unsatisfiable range; raises
+    ValueError for anything else (including multiple ranges), which callers
+    treat as "ignore the Range header".
+    """
+    match = _RANGE_RE.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        raise ValueError(range_header)
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last `last` bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, end
+
+
+async def file_download_response(
+    request: Request,
+    path: str,
+    etag: str | None = None,
+    filename: str | None = None,
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """
+    Serve a file with strong validators and single-range support:
+    `If-None-Match` gives a 304, `Range` a 206 (or a 416 when unsatisfiable),
+    and `If-Range` falls back to the full file once the content has changed.
+    """
+    stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    size = stat_result.st_size
+    if etag is None:
+        etag = f'"{stat_result.st_mtime_ns:x}-{size:x}"'
+    headers = {"etag": etag, "cache-control": cache_control}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["accept-ranges"] = "bytes"
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # Only a strong ETag match keeps a resumed download consistent
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            pass
+        else:
+            if byte_range is None:
+                return Response(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    headers={**headers, "content-range": f"bytes */{size}"},
+                )
+            start, end = byte_range
+            return RangeFileResponse(
+                path,
+                stat_result,
+                start,
+                end,
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                headers={**headers, "content-range": f"bytes {start}-{end}/{size}"},
+                filename=filename,
+            )
+
+    return RangeFileResponse(path, stat_result, headers=headers, filename=filename)
@@ -1,27 +1,77 @@
 from typing import Annotated, Union
 
-from fastapi import APIRouter, Depends, Form, Header, HTTPException, Request
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session
-
-from app.db import get_session
-from app.models.todo import TodoCreate
-from app.models.user import User
+from fastapi import (
+    APIRouter,
+    Depends,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pydantic import StringConstraints, TypeAdapter
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db import get_async_session, get_async_session_maker
+from app.models.todo import (
+    TODO_TITLE_MAX_LENGTH,
+    Todo,
+    TodoCreate,
+    TodoList,
+    TodoPage,
+    TodoRead,
+    TodosDeleted,
+    TodosReset,
+)
+from app.models.user import Principal
+from app.responses import (
+    api_response,
+    etag_matches,
+    file_download_response,
+    negotiate_api_media_type,
+)
 from app.routes.user import check_auth
-from app.utils.jwt import verify_token
+from app.templating import stream_template, templates
+from app.utils.attachments import attach_upload_to_todo_async
+from app.utils.jwt import get_request_token_status
 from app.utils.todo import (
-    db_create_todo,
-    db_delete_todo,
-    db_get_user_todos,
-    db_toggle_todo,
-    db_update_todo,
+    MAX_TODO_PAGE_SIZE,
+    TODO_PAGE_SIZE,
+    TODO_SEARCH_LIMIT,
+    TodoFilter,
+    TodoSort,
+    db_bulk_create_todos_async,
+    db_create_todo_async,
+    db_delete_todo_async,
+    db_delete_todos_async,
+    db_get_todo_counts_async,
+    db_get_todo_version_async,
+    db_get_user_todos_async,
+    db_get_user_todos_page_async,
+    db_search_user_todos_async,
+    db_set_todos_done_async,
+    db_toggle_todo_async,
+    db_update_todo_async,
+    get_user_todo_async,
+    stream_user_todos_async,
+    todo_event_stream,
+    todo_list_etag,
 )
 from app.utils.user import get_current_user
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+todo_list_adapter = TypeAdapter(list[TodoRead])
+
+
+def render_todo_fragment(request: Request, todo: Todo):
+    """Render the `<li>` for a single todo, for swapping over its current row."""
+    return templates.TemplateResponse(
+        request=request, name="todo.html", context={"todo": todo}
+    )
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -33,8 +83,8 @@ async def index(request: Request):
     username = None
 
     if auth_status_value == "valid":
-        token = request.cookies.get("Authorization", "").replace("Bearer ", "")
-        payload = verify_token(token)
+        # Already verified by `check_auth` for this request
+        payload = get_request_token_status(request)
         is_authenticated = True
         username = payload["data"].get("sub")
 
@@ -48,69 +98,322 @@ async def index(request: Request):
     )
 
 
+async def stream_todo_list(
+    user_id: str,
+    session_maker: async_sessionmaker,
+    todo_filter: TodoFilter = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+):
+    # The request's session is closed before a streamed body is sent
+    async with session_maker() as session:
+        todos = stream_user_todos_async(session, user_id, todo_filter, sort)
+        async for chunk in stream_template("todos.html", {"todos": todos}):
+            yield chunk
+
+
 @router.get("/todos", response_class=HTMLResponse)
 async def list_todos(
     request: Request,
+    cursor: Union[str, None] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_TODO_PAGE_SIZE)] = TODO_PAGE_SIZE,
+    whole_list: Annotated[bool, Query(alias="all")] = False,
+    todo_filter: Annotated[TodoFilter, Query(alias="filter")] = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    session_maker: async_sessionmaker = Depends(get_async_session_maker),
+    current_user: Principal = Depends(get_current_user),
+):
+    # Revalidation costs one primary-key lookup when nothing has changed
+    version = await db_get_todo_version_async(session, current_user.id)
+    if hx_request:
+        media_type = "text/html"
+    else:
+        media_type = negotiate_api_media_type(request.headers.get("accept"))
+    etag = todo_list_etag(
+        current_user.id,
+        version,
+        "all" if whole_list else (cursor, limit),
+        todo_filter.value,
+        sort.value,
+        media_type,
+    )
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "HX-Request, Accept, Cookie",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if whole_list and hx_request:
+        # Rows are rendered and sent while later ones are still being fetched
+        return StreamingResponse(
+            stream_todo_list(current_user.id, session_maker, todo_filter, sort),
+            media_type="text/html",
+            headers=headers,
+        )
+    if whole_list:
+        todos = await db_get_user_todos_async(
+            session, current_user.id, todo_filter, sort, version
+        )
+        return api_response(request, TodoPage(items=todos), headers=headers)
+
+    todos, next_cursor = await db_get_user_todos_page_async(
+        session, current_user.id, cursor, limit, version, todo_filter, sort
+    )
+    if hx_request:
+        # The template ends the page with a sentinel row that fetches the next
+        # page of the same view once it is scrolled into view
+        return templates.TemplateResponse(
+            request=request,
+            name="todos.html",
+            context={
+                "todos": todos,
+                "next_cursor": next_cursor,
+                "limit": limit,
+                "filter": todo_filter.value,
+                "sort": sort.value,
+            },
+            headers=headers,
+        )
+    return api_response(
+        request, TodoPage(items=todos, next_cursor=next_cursor), headers=headers
+    )
+
+
+@router.get("/todos/search", response_class=HTMLResponse)
+async def search_todos(
+    request: Request,
+    q: Annotated[str, Query(max_length=200)] = "",
+    todo_filter: Annotated[TodoFilter, Query(alias="filter")] = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
     hx_request: Annotated[Union[str, None], Header()] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
 ):
-    todos = db_get_user_todos(session, current_user.id)
+    if hx_request and not q.strip():
+        # Search box cleared: back to the first page of the view it sends along
+        version = await db_get_todo_version_async(session, current_user.id)
+        todos, next_cursor = await db_get_user_todos_page_async(
+            session, current_user.id, None, TODO_PAGE_SIZE, version, todo_filter, sort
+        )
+        return templates.TemplateResponse(
+            request=request,
+            name="todos.html",
+            context={
+                "todos": todos,
+                "next_cursor": next_cursor,
+                "limit": TODO_PAGE_SIZE,
+                "filter": todo_filter.value,
+                "sort": sort.value,
+            },
+        )
+
+    todos, truncated = await db_search_user_todos_async(
+        session, current_user.id, q, TODO_SEARCH_LIMIT
+    )
     if hx_request:
         return templates.TemplateResponse(
-            request=request, name="todos.html", context={"todos": todos}
+            request=request,
+            name="todo_search.html",
+            context={"todos": todos, "q": q, "truncated": truncated},
         )
-    return JSONResponse(content=jsonable_encoder(todos))
+    return api_response(request, TodoList(items=todos))
+
+
+@router.get("/todos/counts", response_class=HTMLResponse)
+async def get_todo_counts(
+    request: Request,
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    counts = await db_get_todo_counts_async(session, current_user.id)
+    if hx_request:
+        return templates.TemplateResponse(
+            request=request, name="todo_counts.html", context={"counts": counts}
+        )
+    return api_response(request, counts)
+
+
+@router.get("/todos/stream")
+async def stream_todo_events(
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    # The stream is long-lived: don't hold on to a pooled connection for it
+    await session.close()
+    return StreamingResponse(
+        todo_event_stream(current_user.id, until=current_user.expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/todos/{todo_id}", response_class=HTMLResponse)
+async def get_todo(
+    request: Request,
+    todo_id: str,
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    try:
+        todo = await get_user_todo_async(session, todo_id, current_user.id)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+
+    # Used by other tabs to re-render a row they were told has changed
+    if hx_request:
+        return render_todo_fragment(request, todo)
+    return api_response(request, TodoRead.model_validate(todo))
 
 
 @router.post("/todos", response_class=HTMLResponse)
 async def create_todo(
     request: Request,
-    todo: Annotated[str, Form()],  # form parsing
+    todo: Annotated[str, Form(max_length=TODO_TITLE_MAX_LENGTH)],  # form parsing
     hx_request: Annotated[Union[str, None], Header()] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
 ):
     # Parse form data into `TodoCreate` data model for validation
     todo_data = TodoCreate(title=todo)
 
     try:
-        db_create_todo(session, todo_data, current_user.id)
+        new_todo = await db_create_todo_async(session, todo_data, current_user.id)
 
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
 
-    todos = db_get_user_todos(session, current_user.id)
+    # Only the new row is sent back; the form prepends it to `#todos`
+    if hx_request:
+        return render_todo_fragment(request, new_todo)
+
+    todos = await db_get_user_todos_async(session, current_user.id)
+    return api_response(request, todo_list_adapter.validate_python(todos))
+
+
+def render_bulk_update(
+    request: Request, todos: list[Todo] = (), deleted_ids: list[str] = ()
+):
+    """Out-of-band swaps that update or remove each affected row in place."""
+    return templates.TemplateResponse(
+        request=request,
+        name="todos_oob.html",
+        context={"todos": todos, "deleted_ids": deleted_ids},
+    )
 
+
+def render_bulk_reset(request: Request, hx_request: str | None):
+    """For bulk operations that changed too many todos to swap each one."""
+    if hx_request:
+        return HTMLResponse("", headers={"HX-Trigger": "todos-reset"})
+    return api_response(request, TodosReset())
+
+
+@router.post("/todos/bulk", response_class=HTMLResponse)
+async def bulk_create_todos(
+    request: Request,
+    titles: Annotated[
+        list[Annotated[str, StringConstraints(max_length=TODO_TITLE_MAX_LENGTH)]],
+        Form(),
+    ],
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    try:
+        todos = await db_bulk_create_todos_async(session, titles, current_user.id)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+
+    # New rows, newest first, for prepending to `#todos`
     if hx_request:
         return templates.TemplateResponse(
             request=request, name="todos.html", context={"todos": todos}
         )
-    return JSONResponse(content=jsonable_encoder(todos))
+    return api_response(request, TodoList(items=todos))
+
+
+@router.post("/todos/bulk/done", response_class=HTMLResponse)
+async def bulk_mark_todos_done(
+    request: Request,
+    ids: Annotated[list[str], Form()] = [],
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    # Without `ids`, every one of the user's todos is marked done
+    try:
+        todos = await db_set_todos_done_async(session, current_user.id, ids or None)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+
+    if todos is None:
+        return render_bulk_reset(request, hx_request)
+    if hx_request:
+        return render_bulk_update(request, todos=todos)
+    return api_response(request, TodoList(items=todos))
+
+
+@router.post("/todos/bulk/clear-completed", response_class=HTMLResponse)
+async def clear_completed_todos(
+    request: Request,
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    deleted_ids = await db_delete_todos_async(session, current_user.id, done=True)
+
+    if deleted_ids is None:
+        return render_bulk_reset(request, hx_request)
+    if hx_request:
+        return render_bulk_update(request, deleted_ids=deleted_ids)
+    return api_response(request, TodosDeleted(deleted=deleted_ids))
+
+
+@router.post("/todos/bulk/delete", response_class=HTMLResponse)
+async def bulk_delete_todos(
+    request: Request,
+    ids: Annotated[list[str], Form()],
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    try:
+        deleted_ids = await db_delete_todos_async(session, current_user.id, ids)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+
+    if hx_request:
+        return render_bulk_update(request, deleted_ids=deleted_ids)
+    return api_response(request, TodosDeleted(deleted=deleted_ids))
 
 
 @router.put("/todos/{todo_id}", response_class=HTMLResponse)
 async def update_todo(
     request: Request,
     todo_id: str,
-    title: Annotated[str, Form()],
+    title: Annotated[str, Form(max_length=TODO_TITLE_MAX_LENGTH)],
     hx_request: Annotated[Union[str, None], Header()] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
 ):
     try:
-        db_update_todo(session, todo_id, title)
+        todo = await db_update_todo_async(session, todo_id, title, current_user.id)
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
 
-    # Fetch the updated list of todos
-    todos = db_get_user_todos(session, current_user.id)
-    # Render the updated list of todos
+    # Render only the updated row
     if hx_request:
-        return templates.TemplateResponse(
-            request=request, name="todos.html", context={"todos": todos}
-        )
-    return JSONResponse(content=jsonable_encoder(todos))
+        return render_todo_fragment(request, todo)
+
+    # Fetch the updated list of todos
+    todos = await db_get_user_todos_async(session, current_user.id)
+    return api_response(request, todo_list_adapter.validate_python(todos))
 
 
 @router.post("/todos/{todo_id}/toggle", response_class=HTMLResponse)
@@ -118,23 +421,21 @@ async def toggle_todo(
     request: Request,
     todo_id: str,
     hx_request: Annotated[Union[str, None], Header()] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
 ):
     try:
-        db_toggle_todo(session, todo_id)
+        todo = await db_toggle_todo_async(session, todo_id, current_user.id)
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
 
-    # Fetch the updated list of todos
-    todos = db_get_user_todos(session, current_user.id)
-
-    # Render the updated list of todos
+    # Render only the toggled row
     if hx_request:
-        return templates.TemplateResponse(
-            request=request, name="todos.html", context={"todos": todos}
-        )
-    return JSONResponse(content=jsonable_encoder(todos))
+        return render_todo_fragment(request, todo)
+
+    # Fetch the updated list of todos
+    todos = await db_get_user_todos_async(session, current_user.id)
+    return api_response(request, todo_list_adapter.validate_python(todos))
 
 
 @router.delete("/todos/{todo_id}/delete", response_class=HTMLResponse)
@@ -142,21 +443,95 @@ async def delete_todo(
     request: Request,
     todo_id: str,
     hx_request: Annotated[Union[str, None], Header()] = None,
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
 ):
     try:
-        db_delete_todo(session, todo_id)
+        await db_delete_todo_async(session, todo_id, current_user.id)
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
-    todos = db_get_user_todos(session, current_user.id)
+
+    # An empty body swapped over the row's outerHTML removes it from the list
     if hx_request:
-        return templates.TemplateResponse(
-            request=request, name="todos.html", context={"todos": todos}
+        return HTMLResponse(content="")
+
+    todos = await db_get_user_todos_async(session, current_user.id)
+    return api_response(request, todo_list_adapter.validate_python(todos))
+
+
+# The body is parsed by the handler, so describe it for the API docs by hand
+ATTACHMENT_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+
+@router.post(
+    "/todos/{todo_id}/attachment",
+    response_class=HTMLResponse,
+    openapi_extra=ATTACHMENT_UPLOAD_BODY,
+)
+async def upload_attachment(
+    request: Request,
+    todo_id: str,
+    hx_request: Annotated[Union[str, None], Header()] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    # The `file` field of the multipart body is streamed to the blob store by
+    # `attach_upload_to_todo_async` itself, rather than spooled up front
+    try:
+        todo = await attach_upload_to_todo_async(
+            session, todo_id, current_user.id, request
+        )
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+
+    if hx_request:
+        return render_todo_fragment(request, todo)
+    return api_response(request, TodoRead.model_validate(todo))
+
+
+@router.get("/todos/{todo_id}/attachment")
+async def download_attachment(
+    request: Request,
+    todo_id: str,
+    v: Union[str, None] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_user),
+):
+    todo = await get_user_todo_async(session, todo_id, current_user.id)
+    if not todo.file_path:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    # Blobs are content-addressed, so a URL pinned to the current hash never changes
+    if todo.blob_sha256 and v == todo.blob_sha256:
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-cache"
+    etag = f'"{todo.blob_sha256}"' if todo.blob_sha256 else None
+    try:
+        return await file_download_response(
+            request,
+            todo.file_path,
+            etag=etag,
+            filename=todo.file_name,
+            cache_control=cache_control,
         )
-    return JSONResponse(content=jsonable_encoder(todos))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Attachment not found")
 
 
 @router.get("/test-user")
-def test_user(current_user: User = Depends(get_current_user)):
+def test_user(current_user: Principal = Depends(get_current_user)):
     return current_user
@@ -3,48 +3,49 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session
-
-from app.db import get_session
-from app.models.user import User
-from app.utils.jwt import create_access_token, verify_token
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.db import get_async_session
+from app.models.user import Principal
+from app.templating import templates
+from app.utils.jwt import create_user_access_token, get_request_token_status
+from app.utils.ratelimit import limit_auth_requests
+from app.utils.revocation import revoke_token_async
 from app.utils.user import (
-    authenticate_user,
-    create_user_in_db,
+    authenticate_user_async,
+    create_user_in_db_async,
     get_current_user,
-    get_user_by_username,
+    get_user_by_username_async,
 )
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 
-@router.post("/signup")
-def signup(
+@router.post("/signup", dependencies=[Depends(limit_auth_requests)])
+async def signup(
     username: str = Form(...),
     password: str = Form(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     # check if user exists
-    existing_user = get_user_by_username(username, session)
+    existing_user = await get_user_by_username_async(username, session)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
         )
 
     # if user doesn't exist, create user in the database
-    create_user_in_db(username, password, session)
+    await create_user_in_db_async(username, password, session)
     return {"success": True, "message": "Signup successful! Please log in."}
 
 
-@router.post("/login")
-def login(
+@router.post("/login", dependencies=[Depends(limit_auth_requests)])
+async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ) -> RedirectResponse:
     # authenticate user
-    authenticated_user = authenticate_user(
+    authenticated_user = await authenticate_user_async(
         form_data.username, form_data.password, session
     )
     if not authenticated_user:
@@ -54,7 +55,7 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token({"sub": authenticated_user.username})
+    access_token = create_user_access_token(authenticated_user)
     # Create a redirect response
     response = RedirectResponse(
         # url=f"/?username={authenticated_user.username}",
@@ -76,14 +77,25 @@ async def show_login_form(request: Request):
 
 
 @router.get("/logout")
-async def logout(response: Response):
+async def logout(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_async_session),
+):
+    # Revoke the token server-side as well, so a copy of the cookie stops working
+    token_status = get_request_token_status(request)
+    if token_status and token_status["status"] == "valid":
+        claims = token_status["data"]
+        if "jti" in claims:
+            await revoke_token_async(session, claims)
+
     response = RedirectResponse(url="signup-login", status_code=302)
     response.delete_cookie("Authorization")
     return response
 
 
-@router.get("/me", response_model=User)
-async def get_me(current_user: User = Depends(get_current_user)):
+@router.get("/me", response_model=Principal)
+async def get_me(current_user: Principal = Depends(get_current_user)):
     if current_user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
@@ -93,15 +105,7 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 @router.get("/check-auth")
 async def check_auth(request: Request):
-    token = request.cookies.get("Authorization")
-
-    if not token:
-        return {"status": "unauthorised"}
-
-    # Remove the "Bearer " prefix if it exists
-    token = token.replace("Bearer ", "")
-
-    token_status = verify_token(token)
+    token_status = get_request_token_status(request)
 
     if not token_status:
         return {"status": "unauthorised"}
@@ -1,42 +1,105 @@
-import os
+"""Background job handlers, run by the workers in `app.jobs`."""
 
-import aiofiles
+import logging
 
-from app.utils.todo import get_todo_by_id
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-UPLOAD_DIR = "uploads"
+from app.db import async_session_maker
+from app.dependencies import get_settings
+from app.jobs import enqueue_job, job_handler, job_workers
+from app.models.job import Job, JobStatus
+from app.models.user import User
+from app.utils.attachments import (
+    BLOB_RELEASE_GRACE_SECONDS,
+    collect_garbage_blobs_async,
+)
+from app.utils.revocation import delete_expired_revocations_async
+from app.utils.todo import reconcile_todo_counts_async
 
+settings = get_settings()
+logger = logging.getLogger(__name__)
 
-async def upload_file(file_content: bytes, filename: str, todo_id: str):
-    from app.db import SessionLocal
+# Users recounted per reconcile_todo_counts_batch job
+TODO_COUNTS_RECONCILE_BATCH = 100
 
-    session = None
-    try:
-        session = SessionLocal()
 
-        # Ensure the upload directory exists
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
+@job_handler("collect_blob")
+async def collect_blob(session: AsyncSession, payload: dict):
+    # Queued when an attachment is replaced; the blob may have been reused since
+    await collect_garbage_blobs_async(
+        session, payload["sha256"], grace_seconds=BLOB_RELEASE_GRACE_SECONDS
+    )
 
-        # Create the file path
-        file_path = os.path.join(UPLOAD_DIR, filename)
 
-        # Save the file with the content provided
-        async with aiofiles.open(file_path, "wb") as f:
-            await f.write(file_content)
+@job_handler("collect_blobs")
+async def collect_blobs(session: AsyncSession, payload: dict):
+    # Periodic sweep for blobs orphaned any other way: deleted todos, bulk
+    # deletes, crashes between storing a blob and referencing it
+    await schedule_periodic_job(session, "collect_blobs", settings.blob_gc_interval)
+    removed = await collect_garbage_blobs_async(session)
+    if removed:
+        logger.info("Collected %d unreferenced blobs", removed)
 
-        # Update the todo with the uploaded file path
-        todo = get_todo_by_id(session, todo_id)
-        todo.file_name = filename
-        todo.file_path = file_path
 
-        session.add(todo)
-        session.commit()
+@job_handler("prune_revoked_tokens")
+async def prune_revoked_tokens(session: AsyncSession, payload: dict):
+    await schedule_periodic_job(
+        session, "prune_revoked_tokens", settings.token_denylist_prune_interval
+    )
+    removed = await delete_expired_revocations_async(session)
+    if removed:
+        logger.info("Deleted %d expired token revocations", removed)
 
-    except Exception as e:
-        print(f"Error: {e}")
-        if session:
-            session.rollback()
-        raise
-    finally:
-        if session:
-            session.close()
+
+@job_handler("reconcile_todo_counts")
+async def reconcile_todo_counts(session: AsyncSession, payload: dict):
+    # A full pass, split into batch jobs so each stays short and a retry only
+    # repeats its own batch
+    await schedule_todo_counts_reconcile(session)
+    user_ids = (await session.exec(select(User.id).order_by(User.id))).all()
+    for start in range(0, len(user_ids), TODO_COUNTS_RECONCILE_BATCH):
+        end = start + TODO_COUNTS_RECONCILE_BATCH
+        await enqueue_job(
+            session, "reconcile_todo_counts_batch", {"user_ids": user_ids[start:end]}
+        )
+
+
+@job_handler("reconcile_todo_counts_batch")
+async def reconcile_todo_counts_batch(session: AsyncSession, payload: dict):
+    repaired = 0
+    for user_id in payload["user_ids"]:
+        repaired += await reconcile_todo_counts_async(session, user_id)
+    if repaired:
+        logger.warning("Repaired drifted todo counts for %d users", repaired)
+
+
+async def schedule_periodic_job(session: AsyncSession, name: str, interval: float):
+    """
+    Queue the next run of a job that repeats every `interval` seconds (0:
+    never), unless one is already queued. Handlers call it as they start, so
+    a run that fails for good doesn't end the chain.
+    """
+    if not interval:
+        return
+    statement = select(Job.id).where(Job.name == name, Job.status == JobStatus.queued)
+    if (await session.exec(statement)).first() is None:
+        await enqueue_job(session, name, delay=interval)
+
+
+async def schedule_todo_counts_reconcile(session: AsyncSession):
+    await schedule_periodic_job(
+        session, "reconcile_todo_counts", settings.todo_counts_reconcile_interval
+    )
+
+
+async def schedule_periodic_jobs():
+    # Only processes that run jobs schedule them
+    if not job_workers.running:
+        return
+    async with async_session_maker() as session:
+        await schedule_todo_counts_reconcile(session)
+        await schedule_periodic_job(session, "collect_blobs", settings.blob_gc_interval)
+        await schedule_periodic_job(
+            session, "prune_revoked_tokens", settings.token_denylist_prune_interval
+        )
@@ -0,0 +1,76 @@
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
+
+from app.assets import static_assets
+from app.dependencies import get_settings
+from app.models.todo import Todo
+from app.utils.cache import LRUCache
+
+settings = get_settings()
+
+TEMPLATE_DIR = "app/templates"
+
+# One environment for every router. Compiled templates are kept in memory and
+# their bytecode on disk, so a new worker loads rather than recompiles them
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    bytecode_cache=FileSystemBytecodeCache(settings.template_cache_dir),
+    auto_reload=settings.template_auto_reload,
+)
+templates = Jinja2Templates(env=env)
+# Same templates, compiled for `generate_async` so they can loop over async
+# iterables (e.g. rows streamed from the database) while being sent. Async
+# templates compile to different code, so they get caches of their own
+async_env = env.overlay(
+    enable_async=True,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(
+        settings.template_cache_dir, pattern="__jinja2_async_%s.cache"
+    ),
+)
+
+# Rendered output is sent in chunks of about this size rather than per tag
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Rendered `<li>` rows keyed by (id, version): a row's HTML only changes when
+# the todo does, and every write bumps its version. A maxsize of 0 disables it
+todo_fragment_cache = LRUCache(
+    maxsize=settings.todo_fragment_cache_size, ttl=settings.todo_fragment_cache_ttl
+)
+
+
+def precompile_templates() -> None:
+    """Compile (or load from the bytecode cache) every template up front."""
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+        async_env.get_template(name)
+
+
+async def stream_template(name: str, context: dict):
+    """Render `name` incrementally, yielding HTML as it is produced."""
+    buffer: list[str] = []
+    size = 0
+    async for chunk in async_env.get_template(name).generate_async(context):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def render_todo_row(todo: Todo) -> Markup:
+    key = f"{todo.id}:{todo.version}"
+    html = todo_fragment_cache.get(key)
+    if html is None:
+        html = env.get_template("todo.html").render(todo=todo)
+        todo_fragment_cache.set(key, html)
+    return Markup(html)
+
+
+env.globals["render_todo_row"] = render_todo_row
+env.globals["asset_url"] = static_assets.url
@@ -0,0 +1,298 @@
+import hashlib
+import os
+import tempfile
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+import aiofiles
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.multipart import parse_options_header
+from sqlalchemy import delete, exists, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.dependencies import get_settings
+from app.jobs import enqueue_job
+from app.models.blob import Blob
+from app.models.todo import Todo
+from app.utils.todo import db_set_todo_attachment_async, get_user_todo_async
+
+settings = get_settings()
+
+# A blob that was just dereferenced may be collected straight away unless an
+# upload resolved to it within this window
+BLOB_RELEASE_GRACE_SECONDS = 60
+
+# Allowance for the multipart framing (boundaries, part headers) around the file
+# when judging an upload by its Content-Length
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    file_name: str | None = None
+
+
+def safe_file_name(file_name: str | None) -> str:
+    """Strip any directory components a client put in the upload's name."""
+    name = os.path.basename((file_name or "").replace("\\", "/")).strip()
+    return name if name not in ("", ".", "..") else "attachment"
+
+
+def blob_path(sha256: str) -> str:
+    """Sharded location of a blob: `<upload_dir>/sha256/ab/cd/abcd...`."""
+    return os.path.join(settings.upload_dir, "sha256", sha256[:2], sha256[2:4], sha256)
+
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Attachment is larger than the {settings.max_upload_size} byte limit",
+    )
+
+
+def check_upload_length(request: Request):
+    """Refuse an upload that says it is too large before reading any of it."""
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > settings.max_upload_size + MULTIPART_OVERHEAD:
+        raise upload_too_large()
+
+
+class MultipartFileReader:
+    """
+    Incremental `multipart/form-data` parser that picks out the data of one
+    file field as the body is fed in. Other fields are skipped.
+    """
+
+    def __init__(self, boundary: bytes, field_name: str):
+        self.field_name = field_name.encode()
+        self.file_name: str | None = None
+        self.found = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+        self._data: list[bytes] = []
+        self.parser = multipart.MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self.on_part_begin,
+                "on_header_field": self.on_header_field,
+                "on_header_value": self.on_header_value,
+                "on_header_end": self.on_header_end,
+                "on_headers_finished": self.on_headers_finished,
+                "on_part_data": self.on_part_data,
+                "on_part_end": self.on_part_end,
+            },
+        )
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Parse `chunk`; returns the file data it contained."""
+        self.parser.write(chunk)
+        data, self._data = self._data, []
+        return data
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if (
+            not self.found
+            and options.get(b"name") == self.field_name
+            and b"filename" in options
+        ):
+            self.found = self._in_file = True
+            self.file_name = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._data.append(data[start:end])
+
+    def on_part_end(self):
+        self._in_file = False
+
+
+async def stream_upload_to_temp(
+    request: Request, field_name: str = "file"
+) -> StoredUpload:
+    """
+    Stream the `field_name` file of a multipart upload to a temporary file as
+    the request body arrives, hashing it on the way.
+
+    The body is parsed here rather than by the framework, which would spool all
+    of it to disk before the route ran: the file is written once, and an
+    upload over `max_upload_size` gets a 413 up front if its Content-Length
+    gives it away, or as soon as it grows past the limit otherwise. The temp
+    file is created inside `upload_dir` so it can be renamed into the blob
+    store atomically.
+    """
+    check_upload_length(request)
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data upload",
+        )
+    reader = MultipartFileReader(params[b"boundary"], field_name)
+
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+
+    fd, temp_path = tempfile.mkstemp(dir=settings.upload_dir, prefix=".upload-")
+    os.close(fd)
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            async for chunk in request.stream():
+                try:
+                    data = reader.feed(chunk)
+                except ValueError as e:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Malformed multipart upload",
+                    ) from e
+                for piece in data:
+                    size += len(piece)
+                    if size > settings.max_upload_size:
+                        raise upload_too_large()
+                    digest.update(piece)
+                    buffer += piece
+                # Written in `upload_chunk_size` pieces, whatever the network's
+                if len(buffer) >= settings.upload_chunk_size:
+                    await f.write(bytes(buffer))
+                    buffer.clear()
+            await f.write(bytes(buffer))
+        if not reader.found:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"No {field_name!r} file in the upload",
+            )
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+    return StoredUpload(temp_path, digest.hexdigest(), size, reader.file_name)
+
+
+def move_into_blob_store(temp_path: str, sha256: str) -> str:
+    """
+    Move a fully written temp file to its content address. If the blob is
+    already stored the temp file is simply dropped. Readers never see a
+    partially written blob.
+    """
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+    return path
+
+
+async def db_upsert_blob_async(session: AsyncSession, sha256: str, size: int):
+    statement = (
+        insert(Blob)
+        .values(sha256=sha256, size=size)
+        .on_conflict_do_update(
+            index_elements=[Blob.sha256], set_={"last_used_at": func.now()}
+        )
+    )
+    await session.exec(statement)
+    await session.commit()
+
+
+async def save_upload(session: AsyncSession, request: Request) -> StoredUpload:
+    """
+    Store an upload in the content-addressed blob store.
+
+    The blob row is committed before the file is moved into place, and both
+    happen before any todo references the blob, so a crash at any point
+    leaves at most an unreferenced blob for garbage collection to remove.
+    """
+    temp = await stream_upload_to_temp(request)
+    try:
+        await db_upsert_blob_async(session, temp.sha256, temp.size)
+        path = move_into_blob_store(temp.path, temp.sha256)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temp.path)
+        raise
+    return temp._replace(path=path)
+
+
+async def collect_garbage_blobs_async(
+    session: AsyncSession, sha256: str | None = None, grace_seconds: int | None = None
+) -> int:
+    """
+    Delete blobs no todo references any more (optionally just `sha256`) and
+    that haven't been used for `grace_seconds`, then their files.
+
+    Returns:
+        int: The number of blobs removed.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.blob_gc_grace_seconds
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+
+    statement = delete(Blob).where(
+        ~exists().where(Todo.blob_sha256 == Blob.sha256),
+        Blob.last_used_at <= cutoff,
+    )
+    if sha256 is not None:
+        statement = statement.where(Blob.sha256 == sha256)
+    removed = (await session.exec(statement.returning(Blob.sha256))).scalars().all()
+    await session.commit()
+
+    for removed_sha256 in removed:
+        with suppress(FileNotFoundError):
+            os.remove(blob_path(removed_sha256))
+    return len(removed)
+
+
+async def attach_upload_to_todo_async(
+    session: AsyncSession, todo_id: str, user_id: str, request: Request
+):
+    """
+    Store the file uploaded in `request` as the attachment of one of the
+    user's todos, replacing any previous attachment.
+    """
+    # Check ownership before reading any of the body, then end the transaction:
+    # its connection shouldn't sit idle in the pool's hands for the whole upload
+    todo = await get_user_todo_async(session, todo_id, user_id)
+    previous_sha256 = todo.blob_sha256
+    await session.commit()
+
+    stored = await save_upload(session, request)
+    todo = await db_set_todo_attachment_async(
+        session, todo, safe_file_name(stored.file_name), stored.path, stored.sha256
+    )
+
+    if previous_sha256 and previous_sha256 != stored.sha256:
+        # Collected off the request path, once other uploads have had a chance
+        # to reuse it
+        await enqueue_job(
+            session,
+            "collect_blob",
+            {"sha256": previous_sha256},
+            delay=BLOB_RELEASE_GRACE_SECONDS,
+        )
+    return todo
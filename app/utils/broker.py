@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager, suppress
+
+import asyncpg
+
+from app.db import DATABASE_URL
+from app.dependencies import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Delivered in place of messages a subscriber missed (it fell behind, or the
+# broker lost its connection); the subscriber has to resync from scratch
+RESET = None
+
+
+class Subscription:
+    """
+    Bounded queue of messages for one subscriber. A subscriber that falls
+    `maxsize` messages behind has its backlog replaced by a single `RESET`
+    rather than holding up the publisher or growing without bound.
+    """
+
+    def __init__(self, maxsize: int = 100):
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize)
+
+    def put(self, message: str | None) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESET)
+
+    async def get(self) -> str | None:
+        return await self._queue.get()
+
+
+class Broker:
+    """
+    Interface for publish/subscribe fan-out of string messages by channel.
+    Delivery is at most once: messages published while nobody is subscribed
+    are dropped.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscriptions: dict[str, set[Subscription]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, channel: str, message: str) -> None:
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        subscription = Subscription(self.max_queue)
+        self._subscriptions.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._subscriptions.get(channel, set())
+            subscribers.discard(subscription)
+            if not subscribers:
+                self._subscriptions.pop(channel, None)
+
+    def deliver(self, channel: str, message: str | None) -> None:
+        """Hand a message to this process's subscribers of `channel`."""
+        for subscription in self._subscriptions.get(channel, ()):
+            subscription.put(message)
+
+    def reset_all(self) -> None:
+        for channel in list(self._subscriptions):
+            self.deliver(channel, RESET)
+
+
+class InMemoryBroker(Broker):
+    """Fan-out within this process; enough for a single worker."""
+
+    async def publish(self, channel: str, message: str) -> None:
+        self.deliver(channel, message)
+
+
+class PostgresBroker(Broker):
+    """
+    Fan-out across processes through Postgres `LISTEN/NOTIFY`.
+
+    Every process listens on one Postgres channel, on a dedicated connection
+    outside the pool, and delivers each notification to its own subscribers.
+    Payloads are limited to 8000 bytes by Postgres. If the listening connection
+    drops, subscribers get a `RESET` once it has been re-established.
+    """
+
+    def __init__(self, dsn: str, pg_channel: str = "app_events", max_queue: int = 100):
+        super().__init__(max_queue)
+        self.dsn = dsn
+        self.pg_channel = pg_channel
+        self._listener: asyncpg.Connection | None = None
+        self._publisher: asyncpg.Connection | None = None
+        self._publish_lock = asyncio.Lock()
+        self._reconnect_task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        self._stopping = False
+        await self._listen()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reconnect_task
+            self._reconnect_task = None
+        for connection in (self._listener, self._publisher):
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        self._listener = self._publisher = None
+
+    async def _listen(self) -> None:
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(self.pg_channel, self._on_notify)
+        self._listener.add_termination_listener(self._on_terminated)
+
+    def _on_notify(self, connection, pid, pg_channel, payload: str) -> None:
+        channel, message = json.loads(payload)
+        self.deliver(channel, message)
+
+    def _on_terminated(self, connection) -> None:
+        if not self._stopping and self._reconnect_task is None:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self, max_delay: float = 30.0) -> None:
+        delay = 0.5
+        while not self._stopping:
+            try:
+                await self._listen()
+            except (OSError, asyncpg.PostgresError):
+                logger.warning(
+                    "Event listener reconnect failed, retrying in %ss", delay
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            else:
+                break
+        self._reconnect_task = None
+        # Anything published while we weren't listening is gone
+        self.reset_all()
+
+    async def publish(self, channel: str, message: str) -> None:
+        payload = json.dumps([channel, message])
+        async with self._publish_lock:
+            if self._publisher is None or self._publisher.is_closed():
+                self._publisher = await asyncpg.connect(self.dsn)
+            await self._publisher.execute(
+                "SELECT pg_notify($1, $2)", self.pg_channel, payload
+            )
+
+
+def create_broker() -> Broker:
+    # LISTEN/NOTIFY is only needed once there is more than one worker process
+    if settings.event_broker == "postgres":
+        return PostgresBroker(DATABASE_URL, max_queue=settings.event_queue_size)
+    return InMemoryBroker(max_queue=settings.event_queue_size)
+
+
+broker = create_broker()
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class CacheBackend:
+    """
+    Interface for a cache shared between workers (Redis, Memcached, ...).
+
+    An `LRUCache` with a backend reads and writes only the backend, so a
+    delete in one worker is seen by every other worker's next read.
+    """
+
+    def get(self, key: str) -> Any | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local stand-in for a shared backend, used in tests and development."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._data: dict[str, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Every `delete` bumps a per-key generation. A reader that captures
+    `generation(key)` before going to the database and passes it to `set` will
+    not store a result that was invalidated while it was being computed.
+    A `maxsize` of 0 disables local caching.
+
+    With a shared `backend`, nothing is kept locally: a local copy would go on
+    being served after another worker deleted the key. Generations are still
+    local, so callers that need cross-worker consistency should put a version
+    read from the database into their keys as well.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 30.0,
+        backend: CacheBackend | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._clock = clock
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, key: str) -> int:
+        return self._generations.get(key, 0)
+
+    def get(self, key: str) -> Any | None:
+        if self.backend is not None:
+            value = self.backend.get(key)
+            with self._lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+        return None
+
+    def peek(self, key: str) -> Any | None:
+        """Lookup that neither counts towards the stats nor refreshes LRU order."""
+        if self.backend is not None:
+            return self.backend.get(key)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= self._clock():
+                return None
+            return item[1]
+
+    def set(self, key: str, value: Any, generation: int | None = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self.generation(key):
+                return
+            if self.backend is None:
+                self._store(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, self.ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._generations[key] = self.generation(key) + 1
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def _store(self, key: str, value: Any) -> None:
+        # Callers hold `self._lock`
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
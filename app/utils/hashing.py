@@ -0,0 +1,77 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from app.dependencies import get_settings
+
+settings = get_settings()
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt work on a dedicated executor instead of Starlette's shared
+    threadpool, so a burst of logins can't starve other endpoints.
+
+    At most `max_workers + max_pending` calls are admitted at once; beyond that
+    callers get a 503 with `Retry-After` straight away instead of queueing.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_pending: int = 32,
+        executor_type: str = "process",
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.executor_type = executor_type
+        self._executor: Executor | None = None
+        self._in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_pending
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        if self.executor_type == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password-hasher"
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self._in_flight >= self.capacity:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": str(settings.password_hasher_retry_after)},
+            )
+        self.start()
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hasher_workers,
+    max_pending=settings.password_hasher_max_pending,
+    executor_type=settings.password_hasher_executor,
+)
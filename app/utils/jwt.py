@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 
+from fastapi import Request
 from jose import jwt
 
 from app.dependencies import get_settings
@@ -19,15 +21,29 @@ def create_access_token(
     if expires_delta is None:
         expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    expire = datetime.now(timezone.utc) + expires_delta
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + expires_delta
 
     # Store the expiration time as an integer
     data_to_encode.update({"exp": int(expire.timestamp())})
+    # `iat` and `jti` let individual tokens, or every token issued to a user
+    # before a point in time, be revoked. `iat` keeps its fraction so a token
+    # issued in the same second as such a revocation, but after it, survives
+    data_to_encode.update({"iat": issued_at.timestamp()})
+    data_to_encode.setdefault("jti", uuid4().hex)
 
     encoded_jwt = jwt.encode(data_to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_user_access_token(user, expires_delta: timedelta | None = None) -> str:
+    """
+    Access token carrying everything `get_current_user` needs to build a
+    `Principal` without querying the user table.
+    """
+    return create_access_token({"sub": user.username, "uid": user.id}, expires_delta)
+
+
 def verify_token(token: str) -> dict | None:
     try:
         decoded_token_data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -40,3 +56,24 @@ def verify_token(token: str) -> dict | None:
         return {"status": "expired"}  # Explicit token expiry
     except jwt.JWTError:
         return None
+
+
+_UNSET = object()
+
+
+def get_request_token_status(request: Request) -> dict | None:
+    """
+    `verify_token` result for the request's 'Authorization' cookie.
+
+    The signature is verified at most once per request: the result is kept on
+    `request.state`, which every `Request` built for the same ASGI scope shares,
+    so route handlers and dependencies can all call this freely.
+    Returns None when there is no cookie or the token is invalid.
+    """
+    token_status = getattr(request.state, "token_status", _UNSET)
+    if token_status is _UNSET:
+        token = request.cookies.get("Authorization")
+        # Remove the "Bearer " prefix if it exists
+        token_status = verify_token(token.replace("Bearer ", "")) if token else None
+        request.state.token_status = token_status
+    return token_status
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from fastapi import HTTPException, Request, status
+
+from app.dependencies import get_settings
+
+settings = get_settings()
+
+
+class BucketStore:
+    """
+    Storage for token buckets. The in-memory store is per worker; a shared
+    implementation (e.g. a Redis script doing the same arithmetic atomically)
+    makes the limits hold across workers.
+    """
+
+    def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        """
+        Take one token from the bucket at `key`.
+
+        Returns 0 if a token was available, otherwise the number of seconds
+        until one will be.
+        """
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBucketStore(BucketStore):
+    def __init__(
+        self, max_keys: int = 100_000, clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_keys = max_keys
+        self._clock = clock
+        # key -> (tokens, updated_at), least recently used first
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = self._clock()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill_per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # An evicted bucket comes back full, so evicting only ever errs on
+            # the side of letting a request through
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class TokenBucket:
+    """`capacity` requests in a burst, refilled at `per_minute` requests a minute."""
+
+    def __init__(self, name: str, capacity: float, per_minute: float, store):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = per_minute / 60
+        self.store = store
+
+    def check(self, key: str) -> None:
+        wait = self.store.take(
+            f"{self.name}:{key}", self.capacity, self.refill_per_second
+        )
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(max(1, round(wait)))},
+            )
+
+
+class ConcurrencyLimiter:
+    """Caps how many requests may be inside a section at once; never queues."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    def acquire(self) -> None:
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self.active >= self.limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+auth_bucket_store = InMemoryBucketStore()
+auth_ip_bucket = TokenBucket(
+    "auth-ip",
+    settings.auth_rate_limit_ip_capacity,
+    settings.auth_rate_limit_ip_per_minute,
+    auth_bucket_store,
+)
+auth_username_bucket = TokenBucket(
+    "auth-username",
+    settings.auth_rate_limit_username_capacity,
+    settings.auth_rate_limit_username_per_minute,
+    auth_bucket_store,
+)
+auth_concurrency = ConcurrencyLimiter(settings.auth_max_concurrency)
+
+
+async def limit_auth_requests(request: Request):
+    """
+    Admission control for the bcrypt-backed auth endpoints: per-IP and
+    per-username token buckets plus a global concurrency cap. Rejections
+    happen before any database or bcrypt work.
+    """
+    client_ip = request.client.host if request.client else "unknown"
+    auth_ip_bucket.check(client_ip)
+
+    # FastAPI caches the parsed form on the request, so this doesn't parse the
+    # body a second time
+    form = await request.form()
+    username = form.get("username")
+    if isinstance(username, str) and username:
+        auth_username_bucket.check(username.lower())
+
+    auth_concurrency.acquire()
+    try:
+        yield
+    finally:
+        auth_concurrency.release()
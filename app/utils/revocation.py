@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+
+from sqlalchemy import delete
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.dependencies import get_settings
+from app.models.token import RevokedToken
+from app.utils.jwt import ACCESS_TOKEN_EXPIRE_MINUTES
+
+settings = get_settings()
+
+
+class TokenDenyList:
+    """
+    In-memory copy of the unexpired `RevokedToken` rows.
+
+    Checking a token is a dict lookup. The copy is reloaded from the database
+    at most every `refresh_interval` seconds, so a revocation made by another
+    worker takes effect within that interval; revocations made by this worker
+    take effect immediately.
+    """
+
+    def __init__(self, refresh_interval: float = 30.0):
+        self.refresh_interval = refresh_interval
+        self._token_ids: dict[str, float] = {}
+        self._users: dict[str, float] = {}
+        self._loaded_at: float | None = None
+
+    def is_stale(self) -> bool:
+        return (
+            self._loaded_at is None
+            or monotonic() - self._loaded_at >= self.refresh_interval
+        )
+
+    def load(self, revocations) -> None:
+        self._token_ids = {}
+        self._users = {}
+        for revocation in revocations:
+            self.add(revocation)
+        self._loaded_at = monotonic()
+
+    def add(self, revocation: RevokedToken) -> None:
+        if revocation.jti:
+            self._token_ids[revocation.jti] = revocation.expires_at.timestamp()
+        elif revocation.user_id:
+            revoked_at = revocation.revoked_at.timestamp()
+            self._users[revocation.user_id] = max(
+                revoked_at, self._users.get(revocation.user_id, 0)
+            )
+
+    def is_revoked(self, claims: dict) -> bool:
+        if claims.get("jti") in self._token_ids:
+            return True
+        revoked_at = self._users.get(claims.get("uid"))
+        return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+    def clear(self) -> None:
+        self._token_ids.clear()
+        self._users.clear()
+        self._loaded_at = None
+
+
+token_deny_list = TokenDenyList(settings.token_denylist_refresh_seconds)
+
+
+async def refresh_deny_list_async(session: AsyncSession) -> None:
+    """Reload the deny-list if it is older than its refresh interval."""
+    if not token_deny_list.is_stale():
+        return
+    statement = select(RevokedToken).where(
+        RevokedToken.expires_at > datetime.now(timezone.utc)
+    )
+    token_deny_list.load((await session.exec(statement)).all())
+
+
+async def delete_expired_revocations_async(session: AsyncSession) -> int:
+    """
+    Delete deny-list rows whose tokens have all expired.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    statement = delete(RevokedToken).where(
+        RevokedToken.expires_at < datetime.now(timezone.utc)
+    )
+    result = await session.exec(statement)
+    await session.commit()
+    return result.rowcount
+
+
+async def revoke_token_async(session: AsyncSession, claims: dict) -> RevokedToken:
+    """Revoke a single token, e.g. on logout."""
+    revocation = RevokedToken(
+        jti=claims["jti"],
+        user_id=claims.get("uid"),
+        revoked_at=datetime.now(timezone.utc),
+        expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc),
+    )
+    session.add(revocation)
+    await session.commit()
+    await session.refresh(revocation)
+    token_deny_list.add(revocation)
+    return revocation
+
+
+async def revoke_user_tokens_async(session: AsyncSession, user_id: str) -> RevokedToken:
+    """Force a logout: revoke every token issued to the user until now."""
+    revoked_at = datetime.now(timezone.utc)
+    revocation = RevokedToken(
+        user_id=user_id,
+        revoked_at=revoked_at,
+        # Tokens issued before `revoked_at` are all expired after this
+        expires_at=revoked_at + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    session.add(revocation)
+    await session.commit()
+    await session.refresh(revocation)
+    token_deny_list.add(revocation)
+    return revocation
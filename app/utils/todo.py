@@ -1,13 +1,313 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import re
+import time
+from datetime import datetime
+from enum import Enum
+
 from fastapi import HTTPException, status
+from sqlalchemy import (
+    DateTime,
+    String,
+    any_,
+    bindparam,
+    delete,
+    func,
+    not_,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.exc import SQLAlchemyError
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.dependencies import get_settings
+from app.models.todo import (
+    TODO_TITLE_MAX_LENGTH,
+    Todo,
+    TodoCounter,
+    TodoCounts,
+    TodoCreate,
+)
+from app.utils.broker import RESET, broker
+from app.utils.cache import LRUCache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TODO_PAGE_SIZE = 50
+MAX_TODO_PAGE_SIZE = 200
+# Rows fetched per round trip when streaming a whole list
+TODO_STREAM_BATCH_SIZE = 100
+# Upper bound on the rows a single bulk request may create or name
+MAX_BULK_TODOS = 200
+# Todo ids per change event, and how soon browsers reconnect a dropped stream
+TODO_EVENT_MAX_IDS = 100
+SSE_RETRY_MS = 3000
+# Search returns at most this many matches, for queries of at most this many words
+TODO_SEARCH_LIMIT = 50
+TODO_SEARCH_MAX_TERMS = 8
+
+# Newest first; `id` breaks ties so the order (and therefore the cursor) is stable
+TODO_ORDER_BY = (Todo.created_at.desc(), Todo.id.desc())
+
+
+class TodoFilter(str, Enum):
+    all = "all"
+    active = "active"
+    completed = "completed"
+
+
+class TodoSort(str, Enum):
+    newest = "newest"
+    alphabetical = "alphabetical"
+
+
+# Sort key columns and whether they run descending. Each (filter, sort) view is
+# a range scan over one index on (user_id, *key), partial on `done` when
+# filtered; the last column is unique, which keeps the cursor stable
+TODO_SORT_KEYS = {
+    TodoSort.newest: ((Todo.created_at, Todo.id), True),
+    TodoSort.alphabetical: ((Todo.title, Todo.id), False),
+}
+
+
+# Must match the `ix_todo_user_id_title_search` index expression for the index
+# to be used. It parses titles with 'simple' (no stemming or stop words), which
+# suits short, mixed-language titles
+TODO_SEARCH_VECTOR = func.todo_search_vector(Todo.user_id, Todo.title)
+
+
+def todo_filter_clauses(todo_filter: TodoFilter) -> list:
+    # Written exactly as the partial indexes' predicates so the planner can
+    # match them
+    if todo_filter == TodoFilter.active:
+        return [not_(Todo.done)]
+    if todo_filter == TodoFilter.completed:
+        return [Todo.done]
+    return []
+
+
+def todo_order_by(sort: TodoSort) -> list:
+    columns, descending = TODO_SORT_KEYS[sort]
+    return [column.desc() if descending else column.asc() for column in columns]
+
+
+def encode_todo_cursor(todo: Todo, sort: TodoSort = TodoSort.newest) -> str:
+    """Opaque cursor pointing just past `todo` in `sort` order."""
+    columns, _ = TODO_SORT_KEYS[sort]
+    values = [getattr(todo, column.key) for column in columns]
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps([sort.value, *values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_todo_cursor(cursor: str, sort: TodoSort = TodoSort.newest) -> tuple:
+    columns, _ = TODO_SORT_KEYS[sort]
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, *values = json.loads(raw)
+        # A cursor only means something in the order it was issued for
+        if cursor_sort != sort.value or len(values) != len(columns):
+            raise ValueError(cursor_sort)
+        return tuple(
+            datetime.fromisoformat(value)
+            if isinstance(column.type, DateTime)
+            else str(value)
+            for column, value in zip(columns, values)
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def todo_list_statement(
+    user_id: str,
+    todo_filter: TodoFilter = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+):
+    return (
+        select(Todo)
+        .where(Todo.user_id == user_id, *todo_filter_clauses(todo_filter))
+        .order_by(*todo_order_by(sort))
+    )
+
+
+def todo_page_statement(
+    user_id: str,
+    cursor: str | None,
+    limit: int,
+    todo_filter: TodoFilter = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+):
+    """
+    Keyset page over a user's todos in `sort` order, served by the index for
+    that view (see `TODO_SORT_KEYS`). One extra row is fetched to tell whether
+    another page follows.
+    """
+    statement = todo_list_statement(user_id, todo_filter, sort)
+    if cursor:
+        columns, descending = TODO_SORT_KEYS[sort]
+        key = tuple_(*columns)
+        after = tuple_(*decode_todo_cursor(cursor, sort))
+        statement = statement.where(key < after if descending else key > after)
+    return statement.limit(limit + 1)
+
+
+def split_todo_page(rows, limit: int, sort: TodoSort = TodoSort.newest):
+    todos = list(rows[:limit])
+    next_cursor = encode_todo_cursor(todos[-1], sort) if len(rows) > limit else None
+    return todos, next_cursor
+
+
+# Read-through cache of todo lists, one entry per user holding the lists/pages
+# recently read for that user. Write helpers drop the entry after they commit.
+todo_cache = LRUCache(maxsize=settings.todo_cache_maxsize, ttl=settings.todo_cache_ttl)
+TODO_CACHE_KEYS_PER_USER = 16
+
+
+def get_cached_todos(user_id: str, key: str):
+    entry = todo_cache.get(user_id)
+    if entry is None or key not in entry:
+        return None
+    stored_at, todos, next_cursor = entry[key]
+    # Each list expires on its own, so an entry kept alive by reads of other
+    # pages can't serve a list older than the TTL
+    if stored_at + todo_cache.ttl <= time.time():
+        return None
+    # Hand out fresh, session-less instances so callers can't mutate the cache
+    return [Todo.model_validate(todo) for todo in todos], next_cursor
+
+
+def cache_todos(user_id: str, key: str, todos, next_cursor, generation: int):
+    entry = dict(todo_cache.peek(user_id) or {})
+    entry.pop(key, None)
+    entry[key] = (time.time(), [todo.model_dump() for todo in todos], next_cursor)
+    while len(entry) > TODO_CACHE_KEYS_PER_USER:
+        entry.pop(next(iter(entry)))
+    todo_cache.set(user_id, entry, generation=generation)
 
-from app.models.todo import Todo, TodoCreate
+
+def invalidate_user_todos(user_id: str):
+    todo_cache.delete(user_id)
+
+
+def todo_channel(user_id: str) -> str:
+    return f"todos:{user_id}"
+
+
+async def publish_todo_event(user_id: str, event: str, todo_ids: list[str]):
+    """
+    Tell the user's open tabs which todos were created, updated or deleted.
+    Best effort: the write has already been committed, so a broker failure is
+    logged rather than raised.
+    """
+    try:
+        # Chunked to stay well inside the 8000 byte NOTIFY payload limit
+        for start in range(0, len(todo_ids), TODO_EVENT_MAX_IDS):
+            end = start + TODO_EVENT_MAX_IDS
+            message = json.dumps({"event": event, "ids": list(todo_ids[start:end])})
+            await broker.publish(todo_channel(user_id), message)
+    except Exception:
+        logger.exception("Could not publish %s event for user %s", event, user_id)
+
+
+async def todos_changed(user_id: str, event: str, todo_ids: list[str]):
+    """Run by the async write helpers once their transaction has committed."""
+    invalidate_user_todos(user_id)
+    if todo_ids:
+        await publish_todo_event(user_id, event, todo_ids)
+
+
+async def todos_reset(user_id: str):
+    """
+    Like `todos_changed`, for changes too large to list: open tabs get a reset
+    event and reload the list.
+    """
+    invalidate_user_todos(user_id)
+    try:
+        message = json.dumps({"event": "reset", "ids": []})
+        await broker.publish(todo_channel(user_id), message)
+    except Exception:
+        logger.exception("Could not publish reset event for user %s", user_id)
+
+
+async def todo_event_stream(user_id: str, until: float | None = None):
+    """
+    Server-Sent Events for changes to the user's todos, with a comment line as
+    keep-alive. Ends at `until` (epoch seconds, i.e. when the access token
+    expires) so the browser has to reconnect, and re-authenticate, to go on.
+    """
+    async with broker.subscribe(todo_channel(user_id)) as subscription:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while until is None or time.time() < until:
+            timeout = settings.sse_keepalive_seconds
+            if until is not None:
+                timeout = min(timeout, until - time.time())
+            try:
+                message = await asyncio.wait_for(subscription.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if message is RESET:
+                # Missed events; the page reloads the list instead
+                yield "event: reset\ndata: {}\n\n"
+                continue
+            event = json.loads(message)
+            data = json.dumps({"ids": event["ids"]})
+            yield f"event: {event['event']}\ndata: {data}\n\n"
+
+
+def todo_counter_bump(user_id: str, total: int = 0, done: int = 0):
+    """
+    Upsert advancing the user's list version and moving their todo counts by
+    `total` and `done`. Run it in the same transaction as the write it accounts
+    for, so neither ever runs ahead of the data.
+    """
+    statement = insert(TodoCounter).values(
+        user_id=user_id, version=1, total=total, done=done
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[TodoCounter.user_id],
+        set_={
+            "version": TodoCounter.version + 1,
+            "total": TodoCounter.total + total,
+            "done": TodoCounter.done + done,
+        },
+    )
+
+
+def todo_list_etag(user_id: str, version: int, *variant) -> str:
+    """
+    Weak ETag for one representation (page, format, ...) of a user's list at
+    `version`. The user is part of it so a shared browser can't get a 304 for
+    someone else's list.
+    """
+    key = ":".join(str(part) for part in (user_id, *variant))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+# Sync helpers, for scripts and tests with a plain `Session`. The write helpers
+# keep the counters and cache in step but publish no change events (publishing
+# is async), so open tabs don't see their changes until they reload; request
+# handlers use the async helpers below
 
 
 def db_get_user_todos(session: Session, user_id: str):
-    statement = select(Todo).where(Todo.user_id == user_id)
+    generation = todo_cache.generation(user_id)
+    cached = get_cached_todos(user_id, "all")
+    if cached is not None:
+        return cached[0]
+
+    statement = select(Todo).where(Todo.user_id == user_id).order_by(*TODO_ORDER_BY)
     todos = session.exec(statement).all()
+    cache_todos(user_id, "all", todos, None, generation)
     return todos
 
 
@@ -43,10 +343,12 @@ def db_create_todo(session: Session, todo_data: TodoCreate, user_id: str):
     try:
         # Add the `Todo` instance to the database
         session.add(todo)
+        session.exec(todo_counter_bump(user_id, total=1))
         session.commit()
 
         # to ensure object has latest information from autogenerated id field
         session.refresh(todo)
+        invalidate_user_todos(user_id)
         return todo
 
     except Exception as e:
@@ -58,47 +360,428 @@ def db_create_todo(session: Session, todo_data: TodoCreate, user_id: str):
         )
 
 
-def db_update_todo(session: Session, todo_id: str, title: str):
-    statement = select(Todo).where(Todo.id == todo_id)
-    todo = session.exec(statement).first()
-    if not todo:
+def todo_owner_filter(todo_id: str, user_id: str):
+    # Every mutation is scoped to the owner; someone else's todo is a 404
+    return (Todo.id == todo_id, Todo.user_id == user_id)
+
+
+def check_title_length(title: str):
+    # Routes validate their form fields; this covers every other caller
+    if len(title) > TODO_TITLE_MAX_LENGTH:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Titles are limited to {TODO_TITLE_MAX_LENGTH} characters",
         )
-    todo.title = title
-    session.add(todo)
+
+
+def todo_not_found():
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+
+
+def db_update_todo(session: Session, todo_id: str, title: str, user_id: str):
+    check_title_length(title)
+    # A single UPDATE ... RETURNING: no SELECT beforehand, no refresh after
+    statement = (
+        update(Todo)
+        .where(*todo_owner_filter(todo_id, user_id))
+        .values(title=title, version=Todo.version + 1)
+        .returning(Todo)
+    )
+    todo = session.exec(statement).scalars().one_or_none()
+    if not todo:
+        session.rollback()
+        raise todo_not_found()
+    session.exec(todo_counter_bump(user_id))
+    session.commit()
+    invalidate_user_todos(user_id)
+    return todo
+
+
+def db_toggle_todo(session: Session, todo_id: str, user_id: str):
+    statement = (
+        update(Todo)
+        .where(*todo_owner_filter(todo_id, user_id))
+        .values(done=not_(Todo.done), version=Todo.version + 1)
+        .returning(Todo)
+    )
+    todo = session.exec(statement).scalars().one_or_none()
+    if not todo:
+        session.rollback()
+        raise todo_not_found()
+    session.exec(todo_counter_bump(user_id, done=1 if todo.done else -1))
     session.commit()
-    session.refresh(todo)
+    invalidate_user_todos(user_id)
     return todo
 
 
-def db_toggle_todo(session: Session, todo_id: str):
-    statement = select(Todo).where(Todo.id == todo_id)
-    todo = session.exec(statement).first()
+def db_delete_todo(session: Session, todo_id: str, user_id: str):
+    statement = delete(Todo).where(*todo_owner_filter(todo_id, user_id)).returning(Todo)
+    todo = session.exec(statement).scalars().one_or_none()
+    if not todo:
+        session.rollback()
+        raise todo_not_found()
+    session.exec(todo_counter_bump(user_id, total=-1, done=-int(todo.done)))
+    session.commit()
+    invalidate_user_todos(user_id)
+    return todo
+
+
+# Async counterparts of the helpers above, for use with `AsyncSession` from the
+# `async def` route handlers so that database round trips don't block the loop
+
+
+async def db_get_user_todos_async(
+    session: AsyncSession,
+    user_id: str,
+    todo_filter: TodoFilter = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+    version: int | None = None,
+):
+    key = "all"
+    if (todo_filter, sort) != (TodoFilter.all, TodoSort.newest):
+        key = f"all:{todo_filter.value}:{sort.value}"
+    # As for pages: never serve a list cached before another process's write
+    if version is not None:
+        key = f"v{version}:{key}"
+    generation = todo_cache.generation(user_id)
+    cached = get_cached_todos(user_id, key)
+    if cached is not None:
+        return cached[0]
+
+    statement = todo_list_statement(user_id, todo_filter, sort)
+    todos = (await session.exec(statement)).all()
+    cache_todos(user_id, key, todos, None, generation)
+    return todos
+
+
+async def stream_user_todos_async(
+    session: AsyncSession,
+    user_id: str,
+    todo_filter: TodoFilter = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+    batch_size: int = TODO_STREAM_BATCH_SIZE,
+):
+    """
+    The user's todos in `sort` order, read through a server-side cursor
+    `batch_size` rows at a time instead of being loaded in one go.
+    """
+    statement = todo_list_statement(user_id, todo_filter, sort).execution_options(
+        yield_per=batch_size
+    )
+    async for todo in await session.stream_scalars(statement):
+        yield todo
+
+
+def todo_search_query(q: str) -> str | None:
+    """
+    The first `TODO_SEARCH_MAX_TERMS` terms of what the user typed, or None if
+    it has no words. The database splits them into words, as it does titles,
+    and matches titles containing every word as a prefix (see
+    `TODO_SEARCH_QUERY_FUNCTION`), so results update as they type.
+    """
+    terms = q.split()[:TODO_SEARCH_MAX_TERMS]
+    if not any(re.search(r"[^\W_]", term) for term in terms):
+        return None
+    return " ".join(terms)
+
+
+def todo_search_statement(user_id: str, query: str, limit: int):
+    """
+    Newest `limit` + 1 of the user's todos matching `query`; the extra row
+    tells whether the results were cut off.
+    """
+    return (
+        select(Todo)
+        .where(
+            Todo.user_id == user_id,
+            TODO_SEARCH_VECTOR.op("@@")(func.todo_search_query(user_id, query)),
+        )
+        .order_by(*TODO_ORDER_BY)
+        .limit(limit + 1)
+    )
+
+
+async def db_search_user_todos_async(
+    session: AsyncSession, user_id: str, q: str, limit: int = TODO_SEARCH_LIMIT
+):
+    """Returns (matches, truncated)."""
+    query = todo_search_query(q)
+    if query is None:
+        return [], False
+    rows = (await session.exec(todo_search_statement(user_id, query, limit))).all()
+    return list(rows[:limit]), len(rows) > limit
 
+
+async def db_get_todo_counts_async(session: AsyncSession, user_id: str) -> TodoCounts:
+    """The user's total and done counts: a primary-key lookup, however many."""
+    statement = select(TodoCounter.total, TodoCounter.done).where(
+        TodoCounter.user_id == user_id
+    )
+    row = (await session.exec(statement)).first()
+    return TodoCounts(total=row.total, done=row.done) if row else TodoCounts()
+
+
+async def reconcile_todo_counts_async(session: AsyncSession, user_id: str) -> bool:
+    """
+    Recount the user's todos and repair their counters if they have drifted
+    (e.g. rows changed outside the write helpers).
+
+    The counter row is locked before counting. A write still in flight either
+    committed before the count, and is included, or is waiting on the lock and
+    will apply its delta on top of the repaired counts.
+
+    Returns:
+        bool: Whether the counters needed repairing.
+    """
+    await session.exec(
+        insert(TodoCounter).values(user_id=user_id).on_conflict_do_nothing()
+    )
+    locked = select(TodoCounter).where(TodoCounter.user_id == user_id)
+    counter = (await session.exec(locked.with_for_update())).one()
+    counts = select(func.count(), func.count().filter(Todo.done)).where(
+        Todo.user_id == user_id
+    )
+    total, done = (await session.exec(counts)).one()
+    drifted = (counter.total, counter.done) != (total, done)
+    if drifted:
+        counter.total, counter.done = total, done
+        session.add(counter)
+    await session.commit()
+    return drifted
+
+
+async def db_get_todo_version_async(session: AsyncSession, user_id: str) -> int:
+    """The user's list version: a primary-key lookup, 0 before the first write."""
+    statement = select(TodoCounter.version).where(TodoCounter.user_id == user_id)
+    return (await session.exec(statement)).first() or 0
+
+
+async def db_get_user_todos_page_async(
+    session: AsyncSession,
+    user_id: str,
+    cursor: str | None = None,
+    limit=TODO_PAGE_SIZE,
+    version: int | None = None,
+    todo_filter: TodoFilter = TodoFilter.all,
+    sort: TodoSort = TodoSort.newest,
+):
+    # Keyed by version when known, so a page cached before a write that another
+    # process made is never served under the newer version's ETag
+    key = f"page:{todo_filter.value}:{sort.value}:{cursor}:{limit}"
+    if version is not None:
+        key = f"v{version}:{key}"
+    generation = todo_cache.generation(user_id)
+    cached = get_cached_todos(user_id, key)
+    if cached is not None:
+        return cached
+
+    statement = todo_page_statement(user_id, cursor, limit, todo_filter, sort)
+    rows = (await session.exec(statement)).all()
+    todos, next_cursor = split_todo_page(rows, limit, sort)
+    cache_todos(user_id, key, todos, next_cursor, generation)
+    return todos, next_cursor
+
+
+async def get_user_todo_async(session: AsyncSession, todo_id: str, user_id: str):
+    statement = select(Todo).where(*todo_owner_filter(todo_id, user_id))
+    todo = (await session.exec(statement)).first()
     if not todo:
+        raise todo_not_found()
+    return todo
+
+
+async def db_create_todo_async(
+    session: AsyncSession, todo_data: TodoCreate, user_id: str
+):
+    todo = Todo(title=todo_data.title, user_id=user_id)
+    try:
+        session.add(todo)
+        await session.exec(todo_counter_bump(user_id, total=1))
+        await session.commit()
+        await session.refresh(todo)
+        await todos_changed(user_id, "created", [todo.id])
+        return todo
+
+    except Exception as e:
+        await session.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error creating todo: {str(e)}",
         )
 
-    # Toggle the done status
-    todo.done = not todo.done
 
-    # Commit changes
-    session.add(todo)
-    session.commit()
-    session.refresh(todo)
+async def db_update_todo_async(
+    session: AsyncSession, todo_id: str, title: str, user_id: str
+):
+    check_title_length(title)
+    statement = (
+        update(Todo)
+        .where(*todo_owner_filter(todo_id, user_id))
+        .values(title=title, version=Todo.version + 1)
+        .returning(Todo)
+    )
+    todo = (await session.exec(statement)).scalars().one_or_none()
+    if not todo:
+        await session.rollback()
+        raise todo_not_found()
+    await session.exec(todo_counter_bump(user_id))
+    await session.commit()
+    await todos_changed(user_id, "updated", [todo.id])
+    return todo
+
 
+async def db_toggle_todo_async(session: AsyncSession, todo_id: str, user_id: str):
+    statement = (
+        update(Todo)
+        .where(*todo_owner_filter(todo_id, user_id))
+        .values(done=not_(Todo.done), version=Todo.version + 1)
+        .returning(Todo)
+    )
+    todo = (await session.exec(statement)).scalars().one_or_none()
+    if not todo:
+        await session.rollback()
+        raise todo_not_found()
+    await session.exec(todo_counter_bump(user_id, done=1 if todo.done else -1))
+    await session.commit()
+    await todos_changed(user_id, "updated", [todo.id])
     return todo
 
 
-def db_delete_todo(session: Session, todo_id: str):
-    statement = select(Todo).where(Todo.id == todo_id)
-    todo = session.exec(statement).one_or_none()
+async def db_delete_todo_async(session: AsyncSession, todo_id: str, user_id: str):
+    statement = delete(Todo).where(*todo_owner_filter(todo_id, user_id)).returning(Todo)
+    todo = (await session.exec(statement)).scalars().one_or_none()
     if not todo:
+        await session.rollback()
+        raise todo_not_found()
+    await session.exec(todo_counter_bump(user_id, total=-1, done=-int(todo.done)))
+    await session.commit()
+    await todos_changed(user_id, "deleted", [todo.id])
+    return todo
+
+
+async def db_set_todo_attachment_async(
+    session: AsyncSession,
+    todo: Todo,
+    file_name: str,
+    file_path: str,
+    blob_sha256: str | None = None,
+):
+    todo.file_name = file_name
+    todo.file_path = file_path
+    todo.blob_sha256 = blob_sha256
+    todo.version = Todo.version + 1
+    session.add(todo)
+    await session.exec(todo_counter_bump(todo.user_id))
+    await session.commit()
+    await session.refresh(todo)
+    await todos_changed(todo.user_id, "updated", [todo.id])
+    return todo
+
+
+# Bulk operations: each is a single set-based statement in one transaction,
+# scoped to the user, returning the affected rows
+
+
+def todo_ids_param(todo_ids: list[str]):
+    # One array parameter (`= ANY($1)`) rather than an IN list of n parameters
+    return any_(bindparam("todo_ids", list(todo_ids), type_=ARRAY(String)))
+
+
+def check_bulk_size(count: int):
+    if count > MAX_BULK_TODOS:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_TODOS} todos per request",
         )
-    session.delete(todo)
-    session.commit()
-    return todo
+
+
+async def db_bulk_create_todos_async(
+    session: AsyncSession, titles: list[str], user_id: str
+) -> list[Todo]:
+    """INSERT ... VALUES (...), (...) RETURNING, for every non-blank title."""
+    rows = [
+        Todo(title=title, user_id=user_id).model_dump(
+            include={"id", "user_id", "title", "done", "created_at", "version"}
+        )
+        for title in (title.strip() for title in titles)
+        if title
+    ]
+    check_bulk_size(len(rows))
+    for row in rows:
+        check_title_length(row["title"])
+    if not rows:
+        return []
+    statement = insert(Todo).values(rows).returning(Todo)
+    todos = (await session.exec(statement)).scalars().all()
+    if todos:
+        await session.exec(todo_counter_bump(user_id, total=len(todos)))
+    await session.commit()
+    await todos_changed(user_id, "created", [todo.id for todo in todos])
+    # Newest first, like every list of todos
+    return sorted(todos, key=lambda todo: (todo.created_at, todo.id), reverse=True)
+
+
+async def db_set_todos_done_async(
+    session: AsyncSession,
+    user_id: str,
+    todo_ids: list[str] | None = None,
+    done: bool = True,
+) -> list[Todo] | None:
+    """
+    Mark the given todos (or all of the user's) done; returns those that changed.
+
+    One statement however many there are; if more than `MAX_BULK_TODOS` changed,
+    returns None and has open tabs reload rather than listing them.
+    """
+    statement = update(Todo).where(Todo.user_id == user_id, Todo.done != done)
+    if todo_ids is not None:
+        check_bulk_size(len(todo_ids))
+        statement = statement.where(Todo.id == todo_ids_param(todo_ids))
+    statement = statement.values(done=done, version=Todo.version + 1)
+    todos = (await session.exec(statement.returning(Todo))).scalars().all()
+    if todos:
+        changed = len(todos) if done else -len(todos)
+        await session.exec(todo_counter_bump(user_id, done=changed))
+    await session.commit()
+    if len(todos) > MAX_BULK_TODOS:
+        await todos_reset(user_id)
+        return None
+    await todos_changed(user_id, "updated", [todo.id for todo in todos])
+    return todos
+
+
+async def db_delete_todos_async(
+    session: AsyncSession,
+    user_id: str,
+    todo_ids: list[str] | None = None,
+    done: bool | None = None,
+) -> list[str] | None:
+    """
+    Delete the given todos, or those with the given `done` state (clearing
+    completed todos is `done=True`).
+
+    One statement however many there are; if more than `MAX_BULK_TODOS` were
+    deleted, returns None and has open tabs reload rather than listing them.
+
+    Returns:
+        list[str] | None: The ids of the deleted todos.
+    """
+    statement = delete(Todo).where(Todo.user_id == user_id)
+    if todo_ids is not None:
+        check_bulk_size(len(todo_ids))
+        statement = statement.where(Todo.id == todo_ids_param(todo_ids))
+    if done is not None:
+        statement = statement.where(Todo.done == done)
+    rows = (await session.exec(statement.returning(Todo.id, Todo.done))).all()
+    if rows:
+        done_deleted = sum(1 for row in rows if row.done)
+        await session.exec(
+            todo_counter_bump(user_id, total=-len(rows), done=-done_deleted)
+        )
+    await session.commit()
+    if len(rows) > MAX_BULK_TODOS:
+        await todos_reset(user_id)
+        return None
+    deleted = [row.id for row in rows]
+    await todos_changed(user_id, "deleted", deleted)
+    return deleted
@@ -3,26 +3,34 @@ from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db import get_session
+from app.db import get_async_session
+from app.dependencies import get_settings
 from app.models.token import TokenData
-from app.models.user import User
-from app.utils.jwt import verify_token
+from app.models.user import Principal, User
+from app.utils.hashing import password_hasher
+from app.utils.jwt import get_request_token_status
+from app.utils.revocation import refresh_deny_list_async, token_deny_list
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+settings = get_settings()
 
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: int | None = None) -> str:
     """
-    Hashes the provided password using bcrypt with a cost factor of 12.
+    Hashes the provided password using bcrypt.
 
     Args:
         password (str): The password to be hashed.
+        rounds (int, optional): The cost factor. Defaults to the
+            `bcrypt_rounds` setting.
 
     Returns:
         str: The hashed password.
     """
-    hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt(12))
+    rounds = rounds or settings.bcrypt_rounds
+    hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds))
     hashed_password_string = hashed_password.decode()
     return hashed_password_string
 
@@ -43,6 +51,24 @@ def verify_password(stored_hash_password: str, password: str) -> bool:
     return bcrypt.checkpw(password.encode(), stored_hash)
 
 
+def password_needs_rehash(stored_hash_password: str) -> bool:
+    """
+    Checks whether a stored hash was made with a different cost factor than
+    the configured `bcrypt_rounds`.
+
+    Args:
+        stored_hash_password (str): The stored password hash, e.g. "$2b$12$...".
+
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    try:
+        rounds = int(stored_hash_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != settings.bcrypt_rounds
+
+
 def get_user_by_username(username: str, session: Session):
     """
     Retrieves a user from the database by their username.
@@ -114,20 +140,107 @@ def authenticate_user(username: str, password: str, session: Session):
     return user
 
 
-def get_current_user(request: Request, session: Session = Depends(get_session)):
+async def get_user_by_username_async(username: str, session: AsyncSession):
+    """
+    Async counterpart of `get_user_by_username`.
+
+    Args:
+        username (str): The username of the user to retrieve.
+        session (AsyncSession): The async database session to use for the query.
+
+    Returns:
+        User: The user object corresponding to the provided username,
+        or None if no user is found.
+    """
+    statement = select(User).where(User.username == username)
+    user = (await session.exec(statement)).first()
+    return user
+
+
+async def create_user_in_db_async(username: str, password: str, session: AsyncSession):
+    """
+    Async counterpart of `create_user_in_db`. The bcrypt hash is computed on the
+    password hasher's executor.
+
+    Args:
+        username (str): The username for the new user.
+        password (str): The password for the new user.
+        session (AsyncSession): The async database session to use for the operation.
+
+    Returns:
+        User: The newly created user object.
+
+    Raises:
+        HTTPException: If there is an error creating the user in the database.
+    """
+    hashed_password = await password_hasher.run(
+        hash_password, password, settings.bcrypt_rounds
+    )
+    new_user = User(username=username, hashed_password=hashed_password)
+    try:
+        session.add(new_user)
+        await session.commit()
+        await session.refresh(new_user)
+        return new_user
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Error creating user: {str(e)}",
+        )
+
+
+async def authenticate_user_async(username: str, password: str, session: AsyncSession):
+    """
+    Async counterpart of `authenticate_user`. The bcrypt check is run on the
+    password hasher's executor, and a hash made with an outdated cost factor is
+    transparently replaced.
+
+    Args:
+        username (str): The username of the user to authenticate.
+        password (str): The password to verify.
+        session (AsyncSession): The async database session to use for the query.
+
+    Returns:
+        User: The authenticated user, or None if the credentials are invalid.
+    """
+    user = await get_user_by_username_async(username, session)
+    if user is None:
+        return None
+
+    if not await password_hasher.run(verify_password, user.hashed_password, password):
+        return None
+
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await password_hasher.run(
+            hash_password, password, settings.bcrypt_rounds
+        )
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+
+    return user
+
+
+async def get_current_user(
+    request: Request, session: AsyncSession = Depends(get_async_session)
+):
     """
     Verifies the provided token from the 'Authorization' cookie and
-    returns the corresponding user.
+    returns the principal described by its claims. The user table is only
+    queried for tokens issued before the user id was added to the claims.
 
     Args:
         request (Request): The incoming HTTP request.
-        session (Session): The database session to use for the query.
+        session (AsyncSession): The async database session, used to refresh the
+            token deny-list and for the legacy-token fallback.
 
     Returns:
-        User: The user associated with the verified token.
+        Principal: The user associated with the verified token.
 
     Raises:
-        HTTPException: If the token is invalid or the user cannot be found.
+        HTTPException: If the token is invalid, revoked, or the user cannot be
+            found.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -136,14 +249,9 @@ def get_current_user(request: Request, session: Session = Depends(get_session)):
             "WWW-Authenticate": "Bearer",
         },
     )
-    token = request.cookies.get("Authorization")
-    if not token:
-        raise credentials_exception
-
     try:
-        token = token.replace("Bearer ", "")
-
-        payload = verify_token(token)
+        # Verified once per request and shared with `check_auth` and friends
+        payload = get_request_token_status(request)
 
         if payload is None:
             raise credentials_exception
@@ -160,15 +268,28 @@ def get_current_user(request: Request, session: Session = Depends(get_session)):
         if payload["status"] != "valid":
             raise credentials_exception
 
-        username: str = payload["data"].get("sub")
+        claims = payload["data"]
+        username: str = claims.get("sub")
         if not username:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(username=username, user_id=claims.get("uid"))
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_username(token_data.username, session)
-
-    if user is None:
+    await refresh_deny_list_async(session)
+    if token_deny_list.is_revoked(claims):
         raise credentials_exception
-    return user
+
+    if token_data.user_id is None:
+        # Token issued before `uid` was added to the claims
+        user = await get_user_by_username_async(token_data.username, session)
+        if user is None:
+            raise credentials_exception
+        token_data.user_id = user.id
+
+    return Principal(
+        id=token_data.user_id,
+        username=token_data.username,
+        token_id=claims.get("jti"),
+        expires_at=claims.get("exp"),
+    )
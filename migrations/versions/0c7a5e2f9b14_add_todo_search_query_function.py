@@ -0,0 +1,40 @@
+"""Add todo_search_query function
+
+Revision ID: 0c7a5e2f9b14
+Revises: 6b9e2d4a7f31
+Create Date: 2026-10-18 21:04:37.581920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0c7a5e2f9b14"
+down_revision: Union[str, None] = "6b9e2d4a7f31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Search terms split into words by the same parser as the indexed titles
+    op.execute(
+        r"""
+        CREATE OR REPLACE FUNCTION todo_search_query(user_id text, q text)
+        RETURNS tsquery LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT string_agg(
+                ''''
+                    || replace(
+                        replace(user_id || '/' || word, '\', '\\'), '''', ''''''
+                    )
+                    || ''':*',
+                ' & '
+            )::tsquery
+            FROM unnest(tsvector_to_array(to_tsvector('simple', q))) AS word
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION todo_search_query(text, text)")
@@ -0,0 +1,31 @@
+"""Add GIN index for todo title search
+
+Revision ID: 2b7d9f4e6a15
+Revises: 7c1e5a93d0b4
+Create Date: 2026-10-18 15:02:17.530218
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2b7d9f4e6a15"
+down_revision: Union[str, None] = "7c1e5a93d0b4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_todo_title_search",
+        "todo",
+        [sa.text("to_tsvector('simple', title)")],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todo_title_search", table_name="todo")
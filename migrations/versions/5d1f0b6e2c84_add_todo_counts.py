@@ -0,0 +1,45 @@
+"""Add total and done counts to todocounter
+
+Revision ID: 5d1f0b6e2c84
+Revises: 8e3c5a71f9d2
+Create Date: 2026-10-18 17:26:09.118442
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d1f0b6e2c84"
+down_revision: Union[str, None] = "8e3c5a71f9d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "todocounter",
+        sa.Column("total", sa.BigInteger(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "todocounter",
+        sa.Column("done", sa.BigInteger(), server_default="0", nullable=False),
+    )
+    # Start from the current counts; the write helpers keep them up to date
+    op.execute(
+        """
+        INSERT INTO todocounter (user_id, version, total, done)
+        SELECT user_id, 0, count(*), count(*) FILTER (WHERE done)
+        FROM todo
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total = excluded.total, done = excluded.done
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("todocounter", "done")
+    op.drop_column("todocounter", "total")
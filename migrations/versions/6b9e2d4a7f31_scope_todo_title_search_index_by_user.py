@@ -0,0 +1,51 @@
+"""Scope the todo title search index by user
+
+Revision ID: 6b9e2d4a7f31
+Revises: 5d1f0b6e2c84
+Create Date: 2026-10-18 19:12:44.207315
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6b9e2d4a7f31"
+down_revision: Union[str, None] = "5d1f0b6e2c84"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Title words prefixed with the owner's id, so prefix searches only range
+    # over that user's index entries
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION todo_search_vector(user_id text, title text)
+        RETURNS tsvector LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT array_to_tsvector(array_agg(user_id || '/' || word))
+            FROM unnest(tsvector_to_array(to_tsvector('simple', title))) AS word
+        $$
+        """
+    )
+    op.create_index(
+        "ix_todo_user_id_title_search",
+        "todo",
+        [sa.text("todo_search_vector(user_id, title)")],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.drop_index("ix_todo_title_search", table_name="todo")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_todo_title_search",
+        "todo",
+        [sa.text("to_tsvector('simple', title)")],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.drop_index("ix_todo_user_id_title_search", table_name="todo")
+    op.execute("DROP FUNCTION todo_search_vector(text, text)")
@@ -0,0 +1,28 @@
+"""Add todo.version for fragment caching
+
+Revision ID: 7c1e5a93d0b4
+Revises: 4f2d8b61a7c3
+Create Date: 2026-10-18 13:20:44.871306
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7c1e5a93d0b4"
+down_revision: Union[str, None] = "4f2d8b61a7c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "todo",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("todo", "version")
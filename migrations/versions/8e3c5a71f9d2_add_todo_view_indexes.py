@@ -0,0 +1,62 @@
+"""Add partial and title indexes for todo list views
+
+Revision ID: 8e3c5a71f9d2
+Revises: a1c4e7f03b69
+Create Date: 2026-10-18 16:11:48.204597
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8e3c5a71f9d2"
+down_revision: Union[str, None] = "a1c4e7f03b69"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_todo_active_user_id_created_at_id",
+        "todo",
+        ["user_id", "created_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("NOT done"),
+    )
+    op.create_index(
+        "ix_todo_completed_user_id_created_at_id",
+        "todo",
+        ["user_id", "created_at", "id"],
+        unique=False,
+        postgresql_where=sa.text("done"),
+    )
+    op.create_index(
+        "ix_todo_user_id_title_id",
+        "todo",
+        ["user_id", "title", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_todo_active_user_id_title_id",
+        "todo",
+        ["user_id", "title", "id"],
+        unique=False,
+        postgresql_where=sa.text("NOT done"),
+    )
+    op.create_index(
+        "ix_todo_completed_user_id_title_id",
+        "todo",
+        ["user_id", "title", "id"],
+        unique=False,
+        postgresql_where=sa.text("done"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todo_completed_user_id_title_id", table_name="todo")
+    op.drop_index("ix_todo_active_user_id_title_id", table_name="todo")
+    op.drop_index("ix_todo_user_id_title_id", table_name="todo")
+    op.drop_index("ix_todo_completed_user_id_created_at_id", table_name="todo")
+    op.drop_index("ix_todo_active_user_id_created_at_id", table_name="todo")
@@ -0,0 +1,39 @@
+"""Bound todo.title to 500 characters
+
+Revision ID: a1c4e7f03b69
+Revises: 2b7d9f4e6a15
+Create Date: 2026-10-18 16:05:31.642970
+
+"""
+from typing import Sequence, Union
+
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1c4e7f03b69"
+down_revision: Union[str, None] = "2b7d9f4e6a15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Titles were unbounded until now; shorten any that are over the limit
+    op.execute("UPDATE todo SET title = left(title, 500) WHERE length(title) > 500")
+    op.alter_column(
+        "todo",
+        "title",
+        existing_type=sqlmodel.sql.sqltypes.AutoString(),
+        type_=sqlmodel.sql.sqltypes.AutoString(length=500),
+        existing_nullable=False,
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "todo",
+        "title",
+        existing_type=sqlmodel.sql.sqltypes.AutoString(length=500),
+        type_=sqlmodel.sql.sqltypes.AutoString(),
+        existing_nullable=False,
+    )
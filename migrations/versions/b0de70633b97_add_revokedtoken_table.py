@@ -0,0 +1,44 @@
+"""Add revokedtoken table
+
+Revision ID: b0de70633b97
+Revises: e3b26aed7ec2
+Create Date: 2026-10-18 10:02:41.127350
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b0de70633b97"
+down_revision: Union[str, None] = "e3b26aed7ec2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "revokedtoken",
+        sa.Column("id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("jti", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("user_id", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_revokedtoken_expires_at"), "revokedtoken", ["expires_at"], unique=False
+    )
+    op.create_index(op.f("ix_revokedtoken_jti"), "revokedtoken", ["jti"], unique=False)
+    op.create_index(
+        op.f("ix_revokedtoken_user_id"), "revokedtoken", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_revokedtoken_user_id"), table_name="revokedtoken")
+    op.drop_index(op.f("ix_revokedtoken_jti"), table_name="revokedtoken")
+    op.drop_index(op.f("ix_revokedtoken_expires_at"), table_name="revokedtoken")
+    op.drop_table("revokedtoken")
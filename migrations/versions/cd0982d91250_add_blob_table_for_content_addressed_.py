@@ -0,0 +1,56 @@
+"""Add blob table for content-addressed attachments
+
+Revision ID: cd0982d91250
+Revises: f6c2c3f37e33
+Create Date: 2026-10-18 11:12:56.410938
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "cd0982d91250"
+down_revision: Union[str, None] = "f6c2c3f37e33"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blob",
+        sa.Column(
+            "sha256", sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False
+        ),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "last_used_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("sha256"),
+    )
+    op.add_column(
+        "todo",
+        sa.Column("blob_sha256", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+    op.create_index(op.f("ix_todo_blob_sha256"), "todo", ["blob_sha256"], unique=False)
+    op.create_foreign_key(
+        "todo_blob_sha256_fkey", "todo", "blob", ["blob_sha256"], ["sha256"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("todo_blob_sha256_fkey", "todo", type_="foreignkey")
+    op.drop_index(op.f("ix_todo_blob_sha256"), table_name="todo")
+    op.drop_column("todo", "blob_sha256")
+    op.drop_table("blob")
@@ -0,0 +1,42 @@
+"""Add created_at to todo for keyset pagination
+
+Revision ID: e3b26aed7ec2
+Revises: bdb95e8b4faf
+Create Date: 2026-10-18 09:40:12.518204
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3b26aed7ec2"
+down_revision: Union[str, None] = "bdb95e8b4faf"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # server_default backfills existing rows in the same statement
+    op.add_column(
+        "todo",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+    )
+    op.create_index(
+        "ix_todo_user_id_created_at_id",
+        "todo",
+        ["user_id", "created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todo_user_id_created_at_id", table_name="todo")
+    op.drop_column("todo", "created_at")
@@ -0,0 +1,34 @@
+"""Restore file_name and file_path on todo
+
+Revision ID: f6c2c3f37e33
+Revises: b0de70633b97
+Create Date: 2026-10-18 10:41:07.902113
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6c2c3f37e33"
+down_revision: Union[str, None] = "b0de70633b97"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "todo",
+        sa.Column("file_name", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+    op.add_column(
+        "todo",
+        sa.Column("file_path", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("todo", "file_path")
+    op.drop_column("todo", "file_name")
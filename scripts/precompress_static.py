@@ -0,0 +1,49 @@
+"""
+Write `.br` and `.gz` variants of the static assets, for
+`app.assets.PrecompressedStaticFiles` to serve. Run at build time:
+
+    python scripts/precompress_static.py [directory]
+
+Standalone (no app imports) so it runs without the app's settings.
+"""
+import gzip
+import os
+import sys
+
+import brotli
+
+EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map"}
+
+COMPRESSORS = {
+    ".br": lambda data: brotli.compress(data, quality=11),
+    # mtime=0 keeps the output reproducible between builds
+    ".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+}
+
+
+def precompress(directory: str) -> int:
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1] not in EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            for suffix, compress in COMPRESSORS.items():
+                compressed = compress(data)
+                target = path + suffix
+                if len(compressed) >= len(data):
+                    # Not worth it; don't leave an outdated variant behind
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target, "wb") as f:
+                    f.write(compressed)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "app/static"
+    print(f"Wrote {precompress(directory)} precompressed files in {directory}")
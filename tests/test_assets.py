@@ -0,0 +1,69 @@
+import gzip
+import os
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    AssetManifest,
+    PrecompressedStaticFiles,
+    fingerprint,
+    static_assets,
+)
+
+
+def make_client(directory, manifest):
+    static = PrecompressedStaticFiles(directory=str(directory), manifest=manifest)
+    return TestClient(Starlette(routes=[Mount("/static", static)]))
+
+
+def test_fingerprint_depends_on_content():
+    assert fingerprint("main.css", b"a").startswith("main.")
+    assert fingerprint("main.css", b"a").endswith(".css")
+    assert fingerprint("main.css", b"a") != fingerprint("main.css", b"b")
+
+
+def test_asset_url_serves_immutable_copy(tmp_path):
+    (tmp_path / "main.css").write_bytes(b"body { color: red; }")
+    (tmp_path / "main.css.gz").write_bytes(gzip.compress(b"body { color: red; }"))
+    manifest = AssetManifest(str(tmp_path), "/static")
+    client = make_client(tmp_path, manifest)
+
+    url = manifest.url("main.css")
+    assert url == "/static/" + fingerprint("main.css", b"body { color: red; }")
+    assert manifest.original("main.css.gz") is None
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.content == b"body { color: red; }"
+
+    # The unhashed path is still served, but revalidated as usual
+    response = client.get("/static/main.css")
+    assert response.status_code == 200
+    assert "cache-control" not in response.headers
+
+    assert manifest.url("missing.css") == "/static/missing.css"
+
+
+def test_asset_url_auto_reload(tmp_path):
+    (tmp_path / "main.css").write_bytes(b"old")
+    manifest = AssetManifest(str(tmp_path), "/static", auto_reload=True)
+    old_url = manifest.url("main.css")
+
+    (tmp_path / "main.css").write_bytes(b"new")
+    os.utime(tmp_path / "main.css", (1, 1))
+    new_url = manifest.url("main.css")
+    assert new_url != old_url
+    assert make_client(tmp_path, manifest).get(new_url).content == b"new"
+
+
+def test_pages_link_fingerprinted_assets(client):
+    response = client.get("/auth/signup-login")
+    assert static_assets.url("auth.css") in response.text
+
+    response = client.get(static_assets.url("auth.css"))
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
@@ -1,5 +1,17 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from app.models.user import UserCreate
-from app.utils.user import create_user_in_db  # noqa: F401
+from app.utils import jwt as jwt_utils
+from app.utils.hashing import PasswordHasher
+from app.utils.jwt import create_access_token
+from app.utils.ratelimit import InMemoryBucketStore, TokenBucket
+from app.utils.revocation import revoke_user_tokens_async
+from app.utils.user import create_user_in_db, hash_password, settings, verify_password
 
 
 def test_signup(client):
@@ -104,3 +116,136 @@ def test_check_auth_valid_non_logged_in_user(client):
     response = client.get("/auth/check-auth")
     assert response.status_code == 200
     assert response.json()["status"] == "unauthorised"
+
+
+def test_get_me_uses_token_claims(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/auth/me", cookies=cookies)
+    assert response.status_code == 200
+    assert response.json()["id"] == logged_in_user["user_id"]
+    assert response.json()["username"] == logged_in_user["username"]
+
+
+def test_get_me_legacy_token_without_user_id(client, logged_in_user):
+    token = create_access_token({"sub": logged_in_user["username"]})
+    response = client.get("/auth/me", cookies={"Authorization": token})
+    assert response.status_code == 200
+    assert response.json()["id"] == logged_in_user["user_id"]
+
+
+def test_logout_revokes_token(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/auth/logout", cookies=cookies, follow_redirects=False)
+    assert response.status_code == 302
+
+    response = client.get("/auth/me", cookies=cookies)
+    assert response.status_code == 401
+
+
+def test_revoke_user_tokens_forces_logout(client, logged_in_user, async_test_engine):
+    async def revoke():
+        async with AsyncSession(async_test_engine) as session:
+            await revoke_user_tokens_async(session, logged_in_user["user_id"])
+
+    asyncio.run(revoke())
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/auth/me", cookies=cookies)
+    assert response.status_code == 401
+
+
+def test_login_right_after_forced_logout(client, logged_in_user, async_test_engine):
+    async def revoke():
+        async with AsyncSession(async_test_engine) as session:
+            await revoke_user_tokens_async(session, logged_in_user["user_id"])
+
+    asyncio.run(revoke())
+
+    # Most likely within the same second as the revocation
+    token = create_access_token(
+        {"sub": logged_in_user["username"], "uid": logged_in_user["user_id"]}
+    )
+    response = client.get("/auth/me", cookies={"Authorization": token})
+    assert response.status_code == 200
+
+
+def test_index_verifies_token_once(client, logged_in_user, monkeypatch):
+    calls = []
+    original_verify_token = jwt_utils.verify_token
+
+    def counting_verify_token(token):
+        calls.append(token)
+        return original_verify_token(token)
+
+    monkeypatch.setattr(jwt_utils, "verify_token", counting_verify_token)
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/", cookies=cookies)
+    assert response.status_code == 200
+    assert logged_in_user["username"] in response.text
+    assert len(calls) == 1
+
+
+def test_login_rehashes_outdated_cost_factor(client, override_session):
+    user = create_user_in_db("rehash_user", "password123", override_session)
+    user.hashed_password = hash_password("password123", rounds=4)
+    override_session.add(user)
+    override_session.commit()
+
+    response = client.post(
+        "/auth/login",
+        data={"username": "rehash_user", "password": "password123"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+
+    override_session.refresh(user)
+    assert user.hashed_password.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+    assert verify_password(user.hashed_password, "password123")
+
+
+def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(max_workers=1, max_pending=0, executor_type="thread")
+
+    async def saturate():
+        slow = asyncio.create_task(hasher.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        try:
+            await hasher.run(time.sleep, 0)
+        finally:
+            await slow
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(saturate())
+    hasher.shutdown()
+
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+
+def test_login_is_rate_limited_per_username(client, override_session):
+    create_user_in_db("limited_user", "password123", override_session)
+
+    statuses = [
+        client.post(
+            "/auth/login", data={"username": "limited_user", "password": "wrong"}
+        ).status_code
+        for _ in range(settings.auth_rate_limit_username_capacity + 1)
+    ]
+    assert statuses[:-1] == [401] * settings.auth_rate_limit_username_capacity
+    assert statuses[-1] == 429
+
+
+def test_token_bucket_refills():
+    clock = [0.0]
+    store = InMemoryBucketStore(clock=lambda: clock[0])
+    bucket = TokenBucket("test", capacity=1, per_minute=60, store=store)
+
+    bucket.check("key")
+    with pytest.raises(HTTPException) as exc_info:
+        bucket.check("key")
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "1"
+
+    clock[0] = 1.0
+    bucket.check("key")
@@ -0,0 +1,86 @@
+from app.models.todo import TodoCreate
+from app.utils.cache import InMemoryCacheBackend, LRUCache
+from app.utils.todo import db_create_todo, db_get_user_todos, todo_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["size"] == 2
+
+
+def test_lru_cache_entries_expire():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_lru_cache_skips_set_after_concurrent_invalidation():
+    cache = LRUCache(maxsize=10, ttl=60)
+    generation = cache.generation("a")
+    cache.delete("a")
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is None
+
+
+def test_lru_cache_shares_entries_through_backend():
+    backend = InMemoryCacheBackend()
+    worker_1 = LRUCache(maxsize=10, ttl=60, backend=backend)
+    worker_2 = LRUCache(maxsize=10, ttl=60, backend=backend)
+
+    worker_1.set("a", 1)
+    assert worker_2.get("a") == 1
+
+    worker_1.delete("a")
+    assert backend.get("a") is None
+    # No stale local copy left behind in the other worker
+    assert worker_2.get("a") is None
+
+    worker_2.set("a", 2)
+    assert worker_1.get("a") == 2
+
+
+def test_db_write_invalidates_cached_todos(override_session, test_user):
+    todo_cache.clear()
+    db_create_todo(override_session, TodoCreate(title="First"), test_user.id)
+
+    assert [t.title for t in db_get_user_todos(override_session, test_user.id)] == [
+        "First"
+    ]
+    db_get_user_todos(override_session, test_user.id)
+    assert todo_cache.stats()["hits"] == 1
+
+    db_create_todo(override_session, TodoCreate(title="Second"), test_user.id)
+    titles = [t.title for t in db_get_user_todos(override_session, test_user.id)]
+    assert titles == ["Second", "First"]
@@ -0,0 +1,147 @@
+import gzip
+import os
+
+import brotli
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.testclient import TestClient
+
+from app.assets import PrecompressedStaticFiles
+from app.middleware import CompressionMiddleware
+from app.responses import negotiate_content_encoding
+
+BODY = "compress me " * 200
+
+
+def make_app(static_dir=None):
+    async def text(request):
+        return PlainTextResponse(BODY, headers={"ETag": '"abc"'})
+
+    async def small(request):
+        return PlainTextResponse("tiny")
+
+    async def events(request):
+        async def stream():
+            yield "data: hello\n\n" * 100
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def streamed(request):
+        async def stream():
+            for _ in range(4):
+                yield BODY
+
+        return StreamingResponse(stream(), media_type="text/html")
+
+    routes = [
+        Route("/text", text),
+        Route("/small", small),
+        Route("/events", events),
+        Route("/streamed", streamed),
+    ]
+    if static_dir is not None:
+        routes.append(Mount("/static", PrecompressedStaticFiles(directory=static_dir)))
+    app = Starlette(routes=routes)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+def test_negotiate_content_encoding():
+    available = ("br", "gzip")
+    assert negotiate_content_encoding("gzip, deflate, br", available) == "br"
+    assert negotiate_content_encoding("gzip;q=1, br;q=0.5", available) == "gzip"
+    assert negotiate_content_encoding("br;q=0, *", available) == "gzip"
+    assert negotiate_content_encoding("identity", available) is None
+    assert negotiate_content_encoding(None, available) is None
+
+
+def test_compresses_with_negotiated_encoding():
+    client = make_app()
+
+    response = client.get("/text", headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.text == BODY
+
+    response = client.get("/text", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == BODY
+
+    response = client.get("/text", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+
+
+def test_compresses_streamed_responses():
+    client = make_app()
+    response = client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == BODY * 4
+
+
+def test_skips_small_and_event_stream_responses():
+    client = make_app()
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "tiny"
+
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_serves_precompressed_static_files(tmp_path):
+    css = b"body { color: red; }\n" * 100
+    (tmp_path / "main.css").write_bytes(css)
+    (tmp_path / "main.css.br").write_bytes(brotli.compress(css))
+    (tmp_path / "main.css.gz").write_bytes(gzip.compress(css))
+    client = make_app(str(tmp_path))
+
+    response = client.get("/static/main.css", headers={"Accept-Encoding": "br"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["content-type"].startswith("text/css")
+    assert response.content == css
+
+    etag = response.headers["etag"]
+    response = client.get(
+        "/static/main.css",
+        headers={"Accept-Encoding": "br", "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+
+    response = client.get("/static/main.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == css
+
+    # Without a precompressed variant the middleware compresses on the fly
+    response = client.get("/static/main.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == css
+
+
+def test_ignores_stale_precompressed_variant(tmp_path):
+    (tmp_path / "main.css").write_bytes(b"new " * 200)
+    (tmp_path / "main.css.br").write_bytes(brotli.compress(b"old " * 200))
+    os.utime(tmp_path / "main.css.br", (0, 0))
+    client = make_app(str(tmp_path))
+
+    response = client.get("/static/main.css", headers={"Accept-Encoding": "br"})
+    # Compressed on the fly from the current file instead
+    assert response.headers["content-encoding"] == "br"
+    assert response.content == b"new " * 200
+
+
+def test_list_todos_compressed(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    for i in range(20):
+        client.post("/todos", data={"todo": f"Todo number {i}"}, cookies=cookies)
+
+    response = client.get("/todos", headers={"Accept-Encoding": "br"}, cookies=cookies)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert "Todo number 19" in response.text
@@ -0,0 +1,80 @@
+import logging
+
+import pytest
+from sqlalchemy import event, text
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.instrumentation import (
+    QueryStats,
+    _after_cursor_execute,
+    _before_cursor_execute,
+    instrument_engine,
+    log_cache_stats,
+)
+from app.middleware import QueryStatsMiddleware
+from app.utils.cache import LRUCache
+
+
+@pytest.fixture
+def instrumented(test_engine, async_test_engine):
+    # The tests' own engines, hooked up like the app's
+    engines = [test_engine, async_test_engine.sync_engine]
+    for engine in engines:
+        instrument_engine(engine)
+    yield
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def test_query_stats():
+    stats = QueryStats()
+    stats.record("SELECT a WHERE id = $1", 0.002)
+    stats.record("SELECT a WHERE id = $1", 0.004)
+    stats.record("UPDATE b", 0.001)
+
+    assert stats.count == 3
+    assert stats.slowest_statement == "SELECT a WHERE id = $1"
+    assert stats.repeated(2) == [("SELECT a WHERE id = $1", 2)]
+    assert stats.server_timing() == ('db;dur=7.0;desc="3 queries", db-slowest;dur=4.0')
+
+
+def test_server_timing_header(client, logged_in_user, instrumented):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/todos", cookies=cookies)
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+
+
+def test_warns_about_budget_and_repeated_queries(test_engine, instrumented, caplog):
+    async def endpoint(request):
+        with test_engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text("SELECT :i"), {"i": i})
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/", endpoint)])
+    app.add_middleware(QueryStatsMiddleware, query_budget=2, repeat_threshold=3)
+
+    with caplog.at_level(logging.WARNING, logger="app.middleware"):
+        response = TestClient(app).get("/")
+
+    assert 'desc="3 queries"' in response.headers["server-timing"]
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("ran 3 queries (budget 2)" in message for message in messages)
+    assert any("same query 3 times" in message for message in messages)
+
+
+def test_log_cache_stats(caplog):
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    with caplog.at_level(logging.INFO, logger="app.instrumentation"):
+        log_cache_stats("todo", cache)
+    assert "todo cache: 1 hits, 1 misses (50.0% hit rate), 1 of 10 entries" in (
+        caplog.text
+    )
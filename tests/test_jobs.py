@@ -0,0 +1,253 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import jobs
+from app.jobs import claim_job, enqueue_job, job_handler, job_handlers, run_next_job
+from app.models.blob import Blob
+from app.models.job import Job, JobStatus
+from app.models.todo import TodoCounter, TodoCreate
+from app.models.token import RevokedToken
+from app.utils.attachments import settings as attachment_settings
+from app.utils.todo import db_create_todo, db_toggle_todo
+
+
+def test_run_next_job(override_session, async_test_engine):
+    calls = []
+
+    @job_handler("record")
+    async def record(session, payload):
+        calls.append(payload)
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "record", {"n": 1})
+        return await run_next_job(session_maker), await run_next_job(session_maker)
+
+    try:
+        assert asyncio.run(run()) == (True, False)
+    finally:
+        job_handlers.pop("record")
+
+    assert calls == [{"n": 1}]
+    job = override_session.exec(select(Job)).one()
+    assert job.status == JobStatus.done
+    assert job.attempts == 1
+    assert job.locked_at is None
+
+
+def test_failing_job_retries_then_dies(override_session, async_test_engine):
+    @job_handler("explode")
+    async def explode(session, payload):
+        raise RuntimeError("boom")
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "explode", max_attempts=2)
+        assert await run_next_job(session_maker)
+        # Backed off, so not due again yet
+        assert not await run_next_job(session_maker)
+        async with session_maker() as session:
+            job = (await session.exec(select(Job))).one()
+            assert job.status == JobStatus.queued
+            assert "boom" in job.last_error
+            job.run_at = job.created_at
+            await session.commit()
+        assert await run_next_job(session_maker)
+
+    try:
+        asyncio.run(run())
+    finally:
+        job_handlers.pop("explode")
+
+    job = override_session.exec(select(Job)).one()
+    assert job.status == JobStatus.dead
+    assert job.attempts == 2
+
+
+def test_job_that_wrote_before_failing_is_requeued(override_session, async_test_engine):
+    @job_handler("write_then_fail")
+    async def write_then_fail(session, payload):
+        # Leaves the session with pending work to roll back
+        await session.exec(select(Job).with_for_update())
+        session.add(Job(name="side_effect", payload={}, max_attempts=1))
+        await session.flush()
+        raise RuntimeError("boom")
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "write_then_fail", max_attempts=3)
+        assert await run_next_job(session_maker)
+
+    try:
+        asyncio.run(run())
+    finally:
+        job_handlers.pop("write_then_fail")
+
+    job = override_session.exec(select(Job)).one()
+    assert job.status == JobStatus.queued
+    assert job.locked_at is None
+    assert "boom" in job.last_error
+
+
+def test_running_job_keeps_its_lock_fresh(
+    override_session, async_test_engine, monkeypatch
+):
+    monkeypatch.setattr(jobs.settings, "job_lock_timeout", 0.3)
+    seen = []
+
+    @job_handler("slow")
+    async def slow(session, payload):
+        async with AsyncSession(async_test_engine) as other:
+            for _ in range(2):
+                job = (await other.exec(select(Job))).one()
+                seen.append(job.locked_at)
+                await other.rollback()
+                await asyncio.sleep(0.25)
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "slow")
+        assert await run_next_job(session_maker)
+
+    try:
+        asyncio.run(run())
+    finally:
+        job_handlers.pop("slow")
+
+    assert seen[1] > seen[0]
+    assert override_session.exec(select(Job)).one().status == JobStatus.done
+
+
+def test_claim_job_skips_locked_jobs(override_session, async_test_engine):
+    async def run():
+        async with AsyncSession(async_test_engine) as session:
+            for _ in range(2):
+                await enqueue_job(session, "noop")
+        async with AsyncSession(async_test_engine) as first, AsyncSession(
+            async_test_engine
+        ) as second:
+            # Hold the first claim's row lock while the second worker polls
+            await first.connection()
+            await first.exec(select(Job).with_for_update().limit(1))
+            claimed = await claim_job(second)
+            await first.rollback()
+            return claimed
+
+    claimed = asyncio.run(run())
+    assert claimed is not None
+    jobs = override_session.exec(select(Job)).all()
+    assert sorted(job.status for job in jobs) == [JobStatus.queued, JobStatus.running]
+
+
+def test_reconcile_todo_counts(override_session, async_test_engine, test_user):
+    for title in ("a", "b", "c"):
+        todo = db_create_todo(override_session, TodoCreate(title=title), test_user.id)
+    db_toggle_todo(override_session, todo.id, test_user.id)
+    counter = override_session.get(TodoCounter, test_user.id)
+    assert (counter.total, counter.done) == (3, 1)
+
+    # Drift, e.g. from a row changed by hand
+    counter.total, counter.done = 7, 0
+    override_session.add(counter)
+    override_session.commit()
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "reconcile_todo_counts")
+        # The full pass, then the batch it queued
+        assert await run_next_job(session_maker)
+        assert await run_next_job(session_maker)
+        assert not await run_next_job(session_maker)
+
+    asyncio.run(run())
+
+    override_session.expire_all()
+    counter = override_session.get(TodoCounter, test_user.id)
+    assert (counter.total, counter.done) == (3, 1)
+    batch = override_session.exec(
+        select(Job).where(Job.name == "reconcile_todo_counts_batch")
+    ).one()
+    assert batch.payload == {"user_ids": [test_user.id]}
+    # The full pass queued the next one before doing anything else
+    next_run = override_session.exec(
+        select(Job).where(Job.status == JobStatus.queued)
+    ).one()
+    assert next_run.name == "reconcile_todo_counts"
+
+
+def test_collect_blobs_sweeps_orphans(override_session, async_test_engine, monkeypatch):
+    # e.g. left behind by a deleted todo; no job was queued for it
+    monkeypatch.setattr(attachment_settings, "blob_gc_grace_seconds", 0)
+    override_session.add(Blob(sha256="c" * 64, size=4))
+    override_session.commit()
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "collect_blobs")
+        assert await run_next_job(session_maker)
+
+    asyncio.run(run())
+
+    override_session.expire_all()
+    assert override_session.exec(select(Blob)).all() == []
+    next_run = override_session.exec(
+        select(Job).where(Job.status == JobStatus.queued)
+    ).one()
+    assert next_run.name == "collect_blobs"
+
+
+def test_prune_revoked_tokens(override_session, async_test_engine):
+    now = datetime.now(timezone.utc)
+    for expires_at in (now - timedelta(minutes=1), now + timedelta(minutes=1)):
+        override_session.add(
+            RevokedToken(jti=uuid4().hex, revoked_at=now, expires_at=expires_at)
+        )
+    override_session.commit()
+
+    session_maker = async_sessionmaker(
+        async_test_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def run():
+        async with session_maker() as session:
+            await enqueue_job(session, "prune_revoked_tokens")
+        assert await run_next_job(session_maker)
+
+    asyncio.run(run())
+
+    override_session.expire_all()
+    remaining = override_session.exec(select(RevokedToken)).all()
+    assert [revocation.expires_at > now for revocation in remaining] == [True]
+    next_run = override_session.exec(
+        select(Job).where(Job.status == JobStatus.queued)
+    ).one()
+    assert next_run.name == "prune_revoked_tokens"
@@ -1,5 +1,26 @@
-from app.models.todo import TodoCreate
-from app.utils.todo import db_create_todo
+import asyncio
+import hashlib
+import os
+
+import msgpack
+from sqlalchemy.dialects import postgresql
+from sqlmodel import select, text
+
+from app import templating
+from app.models.blob import Blob
+from app.models.todo import TODO_TITLE_MAX_LENGTH, Todo, TodoCreate
+from app.utils import attachments
+from app.utils.attachments import settings
+from app.utils.cache import LRUCache
+from app.utils.todo import (
+    MAX_BULK_TODOS,
+    TodoFilter,
+    TodoSort,
+    db_create_todo,
+    todo_page_statement,
+    todo_search_query,
+    todo_search_statement,
+)
 
 
 def test_list_todos(client, override_session, logged_in_user):
@@ -82,3 +103,717 @@ def test_delete_todo(client, override_session, logged_in_user):
 def test_db_connection(override_session):
     print(f"Connected to database: {override_session.bind.url}")
     assert "test_db" in str(override_session.bind.url)
+
+
+def test_toggle_todo_hx_returns_only_the_row(client, override_session, logged_in_user):
+    todo = db_create_todo(
+        override_session, TodoCreate(title="Toggle Me"), logged_in_user["user_id"]
+    )
+    db_create_todo(
+        override_session, TodoCreate(title="Leave Me"), logged_in_user["user_id"]
+    )
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.post(
+        f"/todos/{todo.id}/toggle", headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert response.status_code == 200
+    assert f'id="todo-{todo.id}"' in response.text
+    assert "Toggle Me" in response.text
+    assert "Leave Me" not in response.text
+
+
+def test_delete_todo_hx_returns_empty_body(client, override_session, logged_in_user):
+    todo = db_create_todo(
+        override_session, TodoCreate(title="Delete Me"), logged_in_user["user_id"]
+    )
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.delete(
+        f"/todos/{todo.id}/delete", headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+def test_list_todos_keyset_pagination(client, override_session, logged_in_user):
+    for i in range(5):
+        db_create_todo(
+            override_session, TodoCreate(title=f"Todo {i}"), logged_in_user["user_id"]
+        )
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/todos", params={"limit": 2}, cookies=cookies)
+    assert response.status_code == 200
+    page = response.json()
+    titles = [todo["title"] for todo in page["items"]]
+    assert titles == ["Todo 4", "Todo 3"]
+
+    seen = list(titles)
+    while page["next_cursor"]:
+        response = client.get(
+            "/todos",
+            params={"limit": 2, "cursor": page["next_cursor"]},
+            cookies=cookies,
+        )
+        page = response.json()
+        seen += [todo["title"] for todo in page["items"]]
+    assert seen == [f"Todo {i}" for i in reversed(range(5))]
+
+    hx_response = client.get(
+        "/todos", params={"limit": 2}, headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert 'hx-trigger="revealed"' in hx_response.text
+
+
+def test_list_todos_invalid_cursor(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get("/todos", params={"cursor": "not-a-cursor"}, cookies=cookies)
+    assert response.status_code == 400
+
+
+def test_upload_attachment(
+    client, override_session, logged_in_user, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    todo = db_create_todo(
+        override_session, TodoCreate(title="With File"), logged_in_user["user_id"]
+    )
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.post(
+        f"/todos/{todo.id}/attachment",
+        files={"file": ("../report.txt", b"hello world", "text/plain")},
+        cookies=cookies,
+    )
+    assert response.status_code == 200
+    assert response.json()["file_name"] == "report.txt"
+    assert response.json()["version"] == 2
+
+    # Where the file is stored isn't exposed
+    sha256 = hashlib.sha256(b"hello world").hexdigest()
+    assert "file_path" not in response.json()
+    assert "blob_sha256" not in response.json()
+    assert response.json()["attachment_url"] == (
+        f"/todos/{todo.id}/attachment?v={sha256}"
+    )
+    with open(
+        os.path.join(str(tmp_path), "sha256", sha256[:2], sha256[2:4], sha256), "rb"
+    ) as f:
+        assert f.read() == b"hello world"
+
+
+def test_upload_holds_no_transaction_while_streaming(
+    client, override_session, logged_in_user, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    todo = db_create_todo(
+        override_session, TodoCreate(title="With File"), logged_in_user["user_id"]
+    )
+    idle_in_transaction = []
+    stream_upload_to_temp = attachments.stream_upload_to_temp
+
+    async def checking_stream_upload_to_temp(request):
+        statement = text(
+            "SELECT count(*) FROM pg_stat_activity"
+            " WHERE state = 'idle in transaction' AND pid <> pg_backend_pid()"
+        )
+        idle_in_transaction.append(override_session.exec(statement).one()[0])
+        return await stream_upload_to_temp(request)
+
+    monkeypatch.setattr(
+        attachments, "stream_upload_to_temp", checking_stream_upload_to_temp
+    )
+    response = client.post(
+        f"/todos/{todo.id}/attachment",
+        files={"file": ("report.txt", b"hello world", "text/plain")},
+        cookies={"Authorization": logged_in_user["cookie"]},
+    )
+    assert response.status_code == 200
+    assert idle_in_transaction == [0]
+
+
+def test_upload_attachment_deduplicates_content(
+    client, override_session, logged_in_user, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    todos = []
+    for title in ("First", "Second"):
+        todo = db_create_todo(
+            override_session, TodoCreate(title=title), logged_in_user["user_id"]
+        )
+        response = client.post(
+            f"/todos/{todo.id}/attachment",
+            files={"file": ("report.pdf", b"same bytes", "application/pdf")},
+            cookies=cookies,
+        )
+        assert response.status_code == 200
+        todos.append(todo)
+
+    for todo in todos:
+        override_session.refresh(todo)
+    assert todos[0].file_path == todos[1].file_path
+    assert override_session.exec(select(Blob)).all()[0].size == len(b"same bytes")
+    assert len(override_session.exec(select(Blob)).all()) == 1
+
+
+def test_upload_attachment_too_large(
+    client, override_session, logged_in_user, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "upload_chunk_size", 4)
+    monkeypatch.setattr(settings, "max_upload_size", 8)
+    todo = db_create_todo(
+        override_session, TodoCreate(title="Big File"), logged_in_user["user_id"]
+    )
+
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.post(
+        f"/todos/{todo.id}/attachment",
+        files={"file": ("big.bin", b"x" * 20, "application/octet-stream")},
+        cookies=cookies,
+    )
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_download_attachment(
+    client, override_session, logged_in_user, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    todo = db_create_todo(
+        override_session, TodoCreate(title="Download"), logged_in_user["user_id"]
+    )
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    client.post(
+        f"/todos/{todo.id}/attachment",
+        files={"file": ("report.txt", b"hello world", "text/plain")},
+        cookies=cookies,
+    )
+    sha256 = hashlib.sha256(b"hello world").hexdigest()
+    url = f"/todos/{todo.id}/attachment"
+
+    response = client.get(url, params={"v": sha256}, cookies=cookies)
+    assert response.status_code == 200
+    assert response.content == b"hello world"
+    assert response.headers["etag"] == f'"{sha256}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "immutable" in response.headers["cache-control"]
+    assert "report.txt" in response.headers["content-disposition"]
+
+    response = client.get(url, headers={"Range": "bytes=6-"}, cookies=cookies)
+    assert response.status_code == 206
+    assert response.content == b"world"
+    assert response.headers["content-range"] == "bytes 6-10/11"
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = client.get(url, headers={"Range": "bytes=-5"}, cookies=cookies)
+    assert response.status_code == 206
+    assert response.content == b"world"
+
+    response = client.get(url, headers={"Range": "bytes=20-"}, cookies=cookies)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */11"
+
+    # A stale If-Range validator means the range no longer applies
+    response = client.get(
+        url, headers={"Range": "bytes=0-4", "If-Range": '"stale"'}, cookies=cookies
+    )
+    assert response.status_code == 200
+    assert response.content == b"hello world"
+
+    response = client.get(
+        url, headers={"If-None-Match": f'"{sha256}"'}, cookies=cookies
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_download_attachment_missing(client, override_session, logged_in_user):
+    todo = db_create_todo(
+        override_session, TodoCreate(title="No File"), logged_in_user["user_id"]
+    )
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get(f"/todos/{todo.id}/attachment", cookies=cookies)
+    assert response.status_code == 404
+
+
+def test_bulk_todo_operations(client, override_session, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.post(
+        "/todos/bulk", data={"titles": ["One", " ", "Two", "Three"]}, cookies=cookies
+    )
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert sorted(item["title"] for item in items) == ["One", "Three", "Two"]
+    ids = {item["title"]: item["id"] for item in items}
+
+    response = client.post(
+        "/todos/bulk/done", data={"ids": [ids["One"], ids["Two"]]}, cookies=cookies
+    )
+    assert sorted(item["title"] for item in response.json()["items"]) == ["One", "Two"]
+    assert all(item["done"] for item in response.json()["items"])
+
+    response = client.post(
+        "/todos/bulk/clear-completed",
+        headers={"HX-Request": "true"},
+        cookies=cookies,
+    )
+    assert f'id="todo-{ids["One"]}" hx-swap-oob="delete"' in response.text
+    assert f'id="todo-{ids["Two"]}" hx-swap-oob="delete"' in response.text
+
+    response = client.post(
+        "/todos/bulk/done", headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert f'id="todo-{ids["Three"]}" hx-swap-oob="true"' in response.text
+
+    response = client.post(
+        "/todos/bulk/delete", data={"ids": [ids["Three"], ids["One"]]}, cookies=cookies
+    )
+    assert response.json() == {"deleted": [ids["Three"]]}
+    assert client.get("/todos", cookies=cookies).json()["items"] == []
+
+
+def test_bulk_operations_on_everything_reset_large_lists(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    for titles in (["x"] * 200, ["y"] * 50):
+        client.post("/todos/bulk", data={"titles": titles}, cookies=cookies)
+
+    # Too many rows to swap one by one: the page reloads the list instead
+    response = client.post(
+        "/todos/bulk/done", headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert response.headers["HX-Trigger"] == "todos-reset"
+    assert response.text == ""
+    counts = client.get("/todos/counts", cookies=cookies).json()
+    assert counts == {"total": 250, "done": 250}
+
+    response = client.post("/todos/bulk/clear-completed", cookies=cookies)
+    assert response.json() == {"reset": True}
+    counts = client.get("/todos/counts", cookies=cookies).json()
+    assert counts == {"total": 0, "done": 0}
+
+
+def test_bulk_operations_are_scoped_to_user(client, user_and_todo, logged_in_user):
+    _, other_todo = user_and_todo
+    cookies = {"Authorization": logged_in_user["cookie"]}
+
+    response = client.post(
+        "/todos/bulk/done", data={"ids": [other_todo.id]}, cookies=cookies
+    )
+    assert response.json() == {"items": []}
+    response = client.post(
+        "/todos/bulk/delete", data={"ids": [other_todo.id]}, cookies=cookies
+    )
+    assert response.json() == {"deleted": []}
+
+
+def test_bulk_create_rejects_too_many(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.post(
+        "/todos/bulk",
+        data={"titles": [f"Todo {i}" for i in range(MAX_BULK_TODOS + 1)]},
+        cookies=cookies,
+    )
+    assert response.status_code == 400
+
+
+def test_cannot_modify_another_users_todo(client, user_and_todo, logged_in_user):
+    _, other_todo = user_and_todo
+    cookies = {"Authorization": logged_in_user["cookie"]}
+
+    response = client.put(
+        f"/todos/{other_todo.id}", data={"title": "Hijacked"}, cookies=cookies
+    )
+    assert response.status_code == 404
+    response = client.post(f"/todos/{other_todo.id}/toggle", cookies=cookies)
+    assert response.status_code == 404
+    response = client.delete(f"/todos/{other_todo.id}/delete", cookies=cookies)
+    assert response.status_code == 404
+
+
+def test_cannot_upload_to_another_users_todo(
+    client, user_and_todo, logged_in_user, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    _, other_todo = user_and_todo
+    response = client.post(
+        f"/todos/{other_todo.id}/attachment",
+        files={"file": ("a.txt", b"data", "text/plain")},
+        cookies={"Authorization": logged_in_user["cookie"]},
+    )
+    assert response.status_code == 404
+    # Refused before any of the body was stored
+    assert os.listdir(tmp_path) == []
+
+
+def test_list_todos_conditional_get(client, override_session, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    db_create_todo(
+        override_session, TodoCreate(title="First"), logged_in_user["user_id"]
+    )
+
+    response = client.get("/todos", cookies=cookies)
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+
+    response = client.get("/todos", headers={"If-None-Match": etag}, cookies=cookies)
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # The HTML fragment is a different representation
+    response = client.get(
+        "/todos",
+        headers={"If-None-Match": etag, "HX-Request": "true"},
+        cookies=cookies,
+    )
+    assert response.status_code == 200
+
+    todo_id = client.post(
+        "/todos/bulk", data={"titles": ["Second"]}, cookies=cookies
+    ).json()["items"][0]["id"]
+    response = client.get("/todos", headers={"If-None-Match": etag}, cookies=cookies)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    etag = response.headers["etag"]
+
+    client.post(f"/todos/{todo_id}/toggle", cookies=cookies)
+    response = client.get("/todos", headers={"If-None-Match": etag}, cookies=cookies)
+    assert response.status_code == 200
+    assert response.json()["items"][0]["done"]
+
+
+def test_get_single_todo_fragment(client, override_session, logged_in_user):
+    todo = db_create_todo(
+        override_session, TodoCreate(title="Single"), logged_in_user["user_id"]
+    )
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    response = client.get(
+        f"/todos/{todo.id}", headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert response.status_code == 200
+    assert f'<li id="todo-{todo.id}"' in response.text
+
+
+def test_list_todos_msgpack(client, override_session, logged_in_user):
+    db_create_todo(
+        override_session, TodoCreate(title="Packed"), logged_in_user["user_id"]
+    )
+    cookies = {"Authorization": logged_in_user["cookie"]}
+
+    response = client.get(
+        "/todos", headers={"Accept": "application/msgpack"}, cookies=cookies
+    )
+    assert response.headers["content-type"] == "application/msgpack"
+    assert "Accept" in response.headers["vary"]
+    page = msgpack.unpackb(response.content)
+    assert page["items"][0]["title"] == "Packed"
+    assert page["next_cursor"] is None
+
+    # A wildcard alone still means JSON
+    response = client.get("/todos", headers={"Accept": "*/*"}, cookies=cookies)
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["items"][0]["title"] == "Packed"
+
+
+def test_todo_rows_fragment_cache(
+    client, override_session, logged_in_user, monkeypatch
+):
+    fragment_cache = LRUCache(maxsize=16, ttl=60)
+    monkeypatch.setattr(templating, "todo_fragment_cache", fragment_cache)
+    todo = db_create_todo(
+        override_session, TodoCreate(title="Cached"), logged_in_user["user_id"]
+    )
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    headers = {"HX-Request": "true"}
+
+    client.get("/todos", headers=headers, cookies=cookies)
+    assert "Cached" in fragment_cache.peek(f"{todo.id}:1")
+
+    # A toggle bumps the version, so the row is rendered afresh
+    response = client.post(f"/todos/{todo.id}/toggle", cookies=cookies)
+    assert response.json()[0]["version"] == 2
+    response = client.get("/todos", headers=headers, cookies=cookies)
+    assert 'checked="true"' in response.text
+    assert 'checked="true"' in fragment_cache.peek(f"{todo.id}:2")
+    assert fragment_cache.stats()["hits"] == 0
+
+    client.get("/todos", headers=headers, cookies=cookies)
+    assert fragment_cache.stats()["hits"] == 1
+
+
+def test_precompile_templates(monkeypatch):
+    templating.precompile_templates()
+
+    def load_source(*args):
+        raise AssertionError("template was compiled on demand")
+
+    monkeypatch.setattr(templating.env.loader, "get_source", load_source)
+    templating.env.get_template("todos.html")
+
+
+def test_list_all_todos_streamed(client, override_session, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    client.post(
+        "/todos/bulk",
+        data={"titles": [f"Todo {i}" for i in range(120)]},
+        cookies=cookies,
+    )
+
+    response = client.get(
+        "/todos",
+        params={"all": "true"},
+        headers={"HX-Request": "true"},
+        cookies=cookies,
+    )
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.text.count('<li id="todo-') == 120
+    assert "load-more" not in response.text
+
+    response = client.get("/todos", params={"all": "true"}, cookies=cookies)
+    assert len(response.json()["items"]) == 120
+
+
+def test_stream_template_yields_chunks(monkeypatch):
+    monkeypatch.setattr(templating, "STREAM_CHUNK_SIZE", 512)
+
+    async def todos():
+        for i in range(20):
+            yield Todo(title=f"Todo {i}", user_id="user")
+
+    async def render():
+        return [
+            chunk
+            async for chunk in templating.stream_template(
+                "todos.html", {"todos": todos()}
+            )
+        ]
+
+    chunks = asyncio.run(render())
+    assert len(chunks) > 1
+    assert "".join(chunks).count('<li id="todo-') == 20
+
+
+def test_todo_search_query():
+    assert todo_search_query("  Buy   mi ") == "Buy mi"
+    assert todo_search_query(" ".join("abcdefghij")) == "a b c d e f g h"
+    assert todo_search_query("  !&|  ") is None
+
+
+def test_search_todos(client, override_session, logged_in_user, monkeypatch):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    titles = ["Buy milk", "Buy bread", "Call mum", "Milkshake recipe"]
+    response = client.post("/todos/bulk", data={"titles": titles}, cookies=cookies)
+    ids = {todo["title"]: todo["id"] for todo in response.json()["items"]}
+
+    response = client.get("/todos/search", params={"q": "mil"}, cookies=cookies)
+    assert response.status_code == 200
+    matches = {todo["title"] for todo in response.json()["items"]}
+    assert matches == {"Buy milk", "Milkshake recipe"}
+
+    response = client.get("/todos/search", params={"q": "buy MIL"}, cookies=cookies)
+    assert [todo["title"] for todo in response.json()["items"]] == ["Buy milk"]
+
+    headers = {"HX-Request": "true"}
+    response = client.get(
+        "/todos/search", params={"q": "zzz"}, headers=headers, cookies=cookies
+    )
+    assert "No todos match" in response.text
+
+    # Cleared search box: the first page of the full list again
+    response = client.get(
+        "/todos/search", params={"q": ""}, headers=headers, cookies=cookies
+    )
+    assert response.text.count('<li id="todo-') == 4
+
+    # ... of the view the page's filter and sort selects are showing
+    client.post("/todos/bulk/done", data={"ids": [ids["Call mum"]]}, cookies=cookies)
+    response = client.get(
+        "/todos/search",
+        params={"q": "", "filter": "completed", "sort": "alphabetical"},
+        headers=headers,
+        cookies=cookies,
+    )
+    assert response.text.count('<li id="todo-') == 1
+    assert f'id="todo-{ids["Call mum"]}"' in response.text
+
+    monkeypatch.setattr("app.routes.todo.TODO_SEARCH_LIMIT", 1)
+    response = client.get(
+        "/todos/search", params={"q": "buy"}, headers=headers, cookies=cookies
+    )
+    assert response.text.count('<li id="todo-') == 1
+    assert "search-more" in response.text
+
+
+def test_search_keeps_punctuated_words_whole(client, logged_in_user):
+    # Split into words the way titles are: these are single words to Postgres
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    titles = ["Email bob@example.com", "Ship release v1.2", "Call bob"]
+    client.post("/todos/bulk", data={"titles": titles}, cookies=cookies)
+
+    for q, title in [
+        ("bob@example.com", "Email bob@example.com"),
+        ("v1.2", "Ship release v1.2"),
+        ("release v1", "Ship release v1.2"),
+        ("it's & !(v1.2)", None),
+    ]:
+        response = client.get("/todos/search", params={"q": q}, cookies=cookies)
+        assert response.status_code == 200
+        matches = [todo["title"] for todo in response.json()["items"]]
+        assert matches == ([title] if title else [])
+
+
+def test_search_todos_is_scoped_to_user(client, user_and_todo, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    _, todo = user_and_todo
+    title = todo.title
+    response = client.get("/todos/search", params={"q": title}, cookies=cookies)
+    assert response.json()["items"] == []
+
+
+def test_search_uses_title_index(override_session):
+    # The user_id index wins on an empty table, so check the match on its own:
+    # it only uses the GIN index if it repeats the index expression exactly
+    match = todo_search_statement("user", "buy", 50).whereclause.clauses[1]
+    statement = select(Todo.id).where(match)
+    sql = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    override_session.exec(text("SET LOCAL enable_seqscan = off"))
+    plan = override_session.exec(text(f"EXPLAIN {sql}")).all()
+    assert "ix_todo_user_id_title_search" in "\n".join(row[0] for row in plan)
+
+
+def test_list_todos_filter_and_sort(client, override_session, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    titles = ["delta", "alpha", "echo", "charlie", "bravo"]
+    client.post("/todos/bulk", data={"titles": titles}, cookies=cookies)
+    todos = client.get("/todos", params={"all": "true"}, cookies=cookies)
+    ids = {todo["title"]: todo["id"] for todo in todos.json()["items"]}
+    for title in ("alpha", "echo"):
+        client.post(f"/todos/{ids[title]}/toggle", cookies=cookies)
+
+    def walk(**params):
+        titles, cursor = [], None
+        while True:
+            response = client.get(
+                "/todos",
+                params={**params, "limit": 1, "cursor": cursor},
+                cookies=cookies,
+            )
+            assert response.status_code == 200
+            page = response.json()
+            titles += [todo["title"] for todo in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return titles
+
+    assert walk(sort="alphabetical") == sorted(titles)
+    assert walk(filter="active", sort="alphabetical") == ["bravo", "charlie", "delta"]
+    assert walk(filter="completed", sort="alphabetical") == ["alpha", "echo"]
+    assert set(walk(filter="completed")) == {"alpha", "echo"}
+
+    response = client.get(
+        "/todos",
+        params={"filter": "active", "sort": "alphabetical", "limit": 2},
+        headers={"HX-Request": "true"},
+        cookies=cookies,
+    )
+    assert "&filter=active&sort=alphabetical" in response.text
+
+    response = client.get(
+        "/todos", params={"filter": "active", "all": "true"}, cookies=cookies
+    )
+    assert len(response.json()["items"]) == 3
+
+
+def test_list_todos_cursor_is_tied_to_sort(client, override_session, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    client.post("/todos/bulk", data={"titles": ["a", "b"]}, cookies=cookies)
+    cursor = client.get("/todos", params={"limit": 1}, cookies=cookies).json()[
+        "next_cursor"
+    ]
+    response = client.get(
+        "/todos", params={"cursor": cursor, "sort": "alphabetical"}, cookies=cookies
+    )
+    assert response.status_code == 400
+
+    response = client.get("/todos", params={"filter": "bogus"}, cookies=cookies)
+    assert response.status_code == 422
+
+
+def test_list_views_use_partial_indexes(override_session):
+    # On an empty table anything goes; rule out the alternatives to an ordered
+    # index scan to check that each view has an index that can serve it alone
+    for setting in ("enable_seqscan", "enable_bitmapscan", "enable_sort"):
+        override_session.exec(text(f"SET LOCAL {setting} = off"))
+    expected = {
+        (TodoFilter.active, TodoSort.newest): "ix_todo_active_user_id_created_at_id",
+        (TodoFilter.completed, TodoSort.newest): (
+            "ix_todo_completed_user_id_created_at_id"
+        ),
+        (TodoFilter.all, TodoSort.alphabetical): "ix_todo_user_id_title_id",
+        (TodoFilter.active, TodoSort.alphabetical): "ix_todo_active_user_id_title_id",
+        (TodoFilter.completed, TodoSort.alphabetical): (
+            "ix_todo_completed_user_id_title_id"
+        ),
+    }
+    for (todo_filter, sort), index in expected.items():
+        statement = todo_page_statement("user", None, 50, todo_filter, sort)
+        sql = statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+        plan = override_session.exec(text(f"EXPLAIN {sql}")).all()
+        assert index in "\n".join(row[0] for row in plan), (todo_filter, sort)
+
+
+def test_todo_counts(client, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+
+    def counts():
+        return client.get("/todos/counts", cookies=cookies).json()
+
+    assert counts() == {"total": 0, "done": 0}
+    client.post("/todos", data={"todo": "single"}, cookies=cookies)
+    client.post("/todos/bulk", data={"titles": ["a", "b", "c"]}, cookies=cookies)
+    todos = client.get("/todos", params={"all": "true"}, cookies=cookies).json()
+    ids = {todo["title"]: todo["id"] for todo in todos["items"]}
+    assert counts() == {"total": 4, "done": 0}
+
+    client.post(f"/todos/{ids['single']}/toggle", cookies=cookies)
+    client.post("/todos/bulk/done", data={"ids": [ids["a"], ids["b"]]}, cookies=cookies)
+    assert counts() == {"total": 4, "done": 3}
+
+    client.delete(f"/todos/{ids['c']}/delete", cookies=cookies)
+    client.post("/todos/bulk/clear-completed", cookies=cookies)
+    assert counts() == {"total": 0, "done": 0}
+
+    for _ in range(6):
+        client.post("/todos/bulk", data={"titles": ["x"] * 200}, cookies=cookies)
+    response = client.get(
+        "/todos/counts", headers={"HX-Request": "true"}, cookies=cookies
+    )
+    assert "0 of 1,200 done" in response.text
+
+
+def test_todo_titles_are_bounded(client, override_session, logged_in_user):
+    cookies = {"Authorization": logged_in_user["cookie"]}
+    long_title = "x" * (TODO_TITLE_MAX_LENGTH + 1)
+
+    response = client.post("/todos", data={"todo": long_title}, cookies=cookies)
+    assert response.status_code == 422
+    response = client.post(
+        "/todos/bulk", data={"titles": ["fine", long_title]}, cookies=cookies
+    )
+    assert response.status_code == 422
+
+    # The longest allowed title still fits in the title indexes
+    longest = "é" * TODO_TITLE_MAX_LENGTH
+    response = client.post("/todos", data={"todo": longest}, cookies=cookies)
+    assert response.status_code == 200
+    todo = override_session.exec(select(Todo)).one()
+    response = client.put(
+        f"/todos/{todo.id}", data={"title": long_title}, cookies=cookies
+    )
+    assert response.status_code == 422
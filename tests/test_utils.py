@@ -1,12 +1,25 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
 from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import Request
 
+from app.models.blob import Blob
 from app.models.todo import Todo, TodoCreate
+from app.responses import RangeFileResponse
+from app.utils.attachments import blob_path, collect_garbage_blobs_async
+from app.utils.attachments import settings as attachment_settings
+from app.utils.attachments import stream_upload_to_temp
 from app.utils.todo import (
     db_create_todo,
     db_delete_todo,
     db_toggle_todo,
     db_update_todo,
 )
+from app.utils.user import create_user_in_db
 
 
 def test_db_create_todo(override_session, test_user):
@@ -23,7 +36,9 @@ def test_db_update_todo(override_session, user_and_todo):
     test_user, test_todo = user_and_todo
 
     updated_todo_title = "Updated Test Todo Item"
-    updated_todo = db_update_todo(override_session, test_todo.id, updated_todo_title)
+    updated_todo = db_update_todo(
+        override_session, test_todo.id, updated_todo_title, test_user.id
+    )
 
     assert updated_todo is not None
     assert updated_todo.id == test_todo.id
@@ -34,7 +49,7 @@ def test_db_update_todo(override_session, user_and_todo):
 def test_db_toggle_todo(override_session, user_and_todo):
     test_user, test_todo = user_and_todo
 
-    toggled_todo = db_toggle_todo(override_session, test_todo.id)
+    toggled_todo = db_toggle_todo(override_session, test_todo.id, test_user.id)
 
     assert toggled_todo is not None
     assert toggled_todo.id == test_todo.id
@@ -43,10 +58,101 @@ def test_db_toggle_todo(override_session, user_and_todo):
 
 
 def test_db_delete_todo(override_session, user_and_todo):
-    _, test_todo = user_and_todo
+    test_user, test_todo = user_and_todo
 
-    db_delete_todo(override_session, test_todo.id)
+    db_delete_todo(override_session, test_todo.id, test_user.id)
     deleted_todo = override_session.exec(
         select(Todo).where(Todo.id == test_todo.id)
     ).first()
     assert deleted_todo is None
+
+
+def test_mutations_are_scoped_to_owner(override_session, user_and_todo):
+    _, test_todo = user_and_todo
+    other_user = create_user_in_db("other_user", "password123", override_session)
+
+    for mutate in (
+        lambda: db_update_todo(override_session, test_todo.id, "Mine", other_user.id),
+        lambda: db_toggle_todo(override_session, test_todo.id, other_user.id),
+        lambda: db_delete_todo(override_session, test_todo.id, other_user.id),
+    ):
+        with pytest.raises(HTTPException) as exc_info:
+            mutate()
+        assert exc_info.value.status_code == 404
+
+    todo = override_session.exec(select(Todo).where(Todo.id == test_todo.id)).one()
+    assert todo.title == "Test Todo Item"
+    assert not todo.done
+
+
+def test_collect_garbage_blobs(
+    override_session, user_and_todo, async_test_engine, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(attachment_settings, "upload_dir", str(tmp_path))
+    _, test_todo = user_and_todo
+
+    for sha256 in ("a" * 64, "b" * 64):
+        path = blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"blob")
+        override_session.add(Blob(sha256=sha256, size=4))
+    override_session.commit()
+    test_todo.blob_sha256 = "a" * 64
+    override_session.add(test_todo)
+    override_session.commit()
+
+    async def collect():
+        async with AsyncSession(async_test_engine) as session:
+            return await collect_garbage_blobs_async(session, grace_seconds=0)
+
+    assert asyncio.run(collect()) == 1
+    assert os.path.exists(blob_path("a" * 64))
+    assert not os.path.exists(blob_path("b" * 64))
+
+
+def test_oversized_upload_is_refused_before_reading_the_body(tmp_path, monkeypatch):
+    monkeypatch.setattr(attachment_settings, "upload_dir", str(tmp_path))
+    monkeypatch.setattr(attachment_settings, "max_upload_size", 1024)
+
+    async def receive():
+        raise AssertionError("the body should not be read")
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [
+            (b"content-type", b"multipart/form-data; boundary=x"),
+            (b"content-length", str(10 * 1024 * 1024).encode()),
+        ],
+    }
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(stream_upload_to_temp(Request(scope, receive)))
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_range_file_response_hands_file_to_zerocopysend(tmp_path):
+    path = tmp_path / "blob"
+    path.write_bytes(b"0123456789")
+    response = RangeFileResponse(path, os.stat(path), start=2, end=5)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "extensions": {"http.response.zerocopysend": {}},
+    }
+    sent = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            # What the server does with it: sendfile() from the file's descriptor
+            file = message["file"]
+            sent.append(os.pread(file.fileno(), message["count"], message["offset"]))
+        sent.append(message["type"])
+
+    asyncio.run(response(scope, None, send))
+    assert sent == [
+        "http.response.start",
+        b"2345",
+        "http.response.zerocopysend",
+    ]